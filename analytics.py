@@ -0,0 +1,101 @@
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+
+from records import OptionRecord
+
+class ChainAnalytics:
+    """
+    Derived analytics (max pain, OI walls, PCR) computed once per snapshot at ingest.
+    Keeps per-chain state so repeated snapshots over the same strikes reuse the
+    payout matrices and report changes against the last persisted snapshot.
+    """
+    def __init__(self, wall_count: int = 3):
+        self.wall_count = wall_count
+        # chain (symbol and expiry) -> (strikes key, call payout matrix, put payout matrix)
+        self.payout_cache: Dict[str, Tuple[bytes, np.ndarray, np.ndarray]] = {}
+        # chain -> analytics of the last snapshot that was actually stored
+        self.previous: Dict[str, Dict[str, Any]] = {}
+
+    def _payout_matrices(self, chain_key: str, strikes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Intrinsic value per unit OI of every strike (columns) at every settlement
+        price (rows). Only rebuilt when the strike ladder changes.
+        """
+        key = strikes.tobytes()
+        cached = self.payout_cache.get(chain_key)
+        if cached and cached[0] == key:
+            return cached[1], cached[2]
+
+        settlement = strikes[:, np.newaxis]
+        call_payout = np.maximum(settlement - strikes[np.newaxis, :], 0.0)
+        put_payout = np.maximum(strikes[np.newaxis, :] - settlement, 0.0)
+        self.payout_cache[chain_key] = (key, call_payout, put_payout)
+        return call_payout, put_payout
+
+    def _walls(self, strikes: np.ndarray, oi: np.ndarray, mask: np.ndarray) -> List[Dict[str, Any]]:
+        """Strikes with the highest OI within the masked range, largest first"""
+        if not mask.any():
+            mask = np.ones_like(mask)
+        candidates = np.flatnonzero(mask)
+        top = candidates[np.argsort(oi[candidates], kind='stable')[::-1][:self.wall_count]]
+        return [{"Strike Price": float(strikes[i]), "OI": float(oi[i])} for i in top]
+
+    def compute(self, chain_key: str, records: List[OptionRecord]) -> Optional[Dict[str, Any]]:
+        """
+        Compute analytics for the latest snapshot of a chain (one symbol and expiry).
+        Call commit() once the snapshot is stored, so changes are measured against it.
+        """
+        if not records:
+            return None
+
+        # Vendor chains are ordered by strike, but sort defensively since max pain relies on it
+        chain = sorted(records, key=lambda record: record.strike_price)
+        strikes = np.array([record.strike_price for record in chain], dtype=float)
+        calls_oi = np.nan_to_num(np.array([record.calls.oi for record in chain], dtype=float))
+        puts_oi = np.nan_to_num(np.array([record.puts.oi for record in chain], dtype=float))
+        calls_change = np.nan_to_num(np.array([record.calls.change_oi for record in chain], dtype=float))
+        puts_change = np.nan_to_num(np.array([record.puts.change_oi for record in chain], dtype=float))
+        spot = float(chain[0].index_close)
+
+        # Max pain: settlement strike minimising total payout to option holders
+        call_payout, put_payout = self._payout_matrices(chain_key, strikes)
+        total_payout = call_payout @ calls_oi + put_payout @ puts_oi
+        max_pain = float(strikes[int(np.argmin(total_payout))])
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            strike_pcr = np.where(calls_oi > 0, puts_oi / calls_oi, np.nan)
+        total_calls_oi = float(calls_oi.sum())
+        total_puts_oi = float(puts_oi.sum())
+        total_calls_change = float(calls_change.sum())
+        total_puts_change = float(puts_change.sum())
+        pcr = round(total_puts_oi / total_calls_oi, 4) if total_calls_oi else None
+        change_pcr = round(total_puts_change / total_calls_change, 4) if total_calls_change else None
+
+        analytics = {
+            "Symbol": chain[0].symbol,
+            "Expiry": chain[0].expiry,
+            "Spot": spot,
+            "Max Pain": max_pain,
+            "PCR": pcr,
+            "Change in OI PCR": change_pcr,
+            "Support": self._walls(strikes, puts_oi, strikes <= spot),
+            "Resistance": self._walls(strikes, calls_oi, strikes >= spot),
+            "Strike PCR": [
+                {"Strike Price": strike, "PCR": None if np.isnan(value) else round(value, 4)}
+                for strike, value in zip(strikes.tolist(), strike_pcr.tolist())
+            ]
+        }
+
+        # Changes against the last stored snapshot of this chain
+        previous = self.previous.get(chain_key)
+        analytics["Max Pain Change"] = max_pain - previous["Max Pain"] if previous else None
+        analytics["PCR Change"] = (
+            round(pcr - previous["PCR"], 4) if previous and pcr is not None and previous["PCR"] is not None else None
+        )
+
+        return analytics
+
+    def commit(self, chain_key: str, analytics: Optional[Dict[str, Any]]) -> None:
+        """Make a stored snapshot's analytics the baseline for the next changes"""
+        if analytics is not None:
+            self.previous[chain_key] = analytics
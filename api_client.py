@@ -1,33 +1,57 @@
 import requests
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 import time
+from concurrent.futures import ThreadPoolExecutor
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from proxy_pool import ProxyPool
+from expiries import ExpiryPolicy, ExpiryCache, chain_expiry, extract_expiries, parse_expiry
+
+API_URL = "https://webapi.niftytrader.in/webapi/option/option-chain-data"
+
 class SymbolConfig:
-    def __init__(self, symbol: str, expiry_date: str, records_count: int = 20):
+    __slots__ = ("symbol", "expiry_date", "records_count", "expiry_policy")
+    
+    def __init__(self, symbol: str, expiry_date: str = "", records_count: int = 20,
+                 expiry_policy: Optional[ExpiryPolicy] = None):
         self.symbol = symbol.lower()
+        # Fixed expiry, used when there is no policy or discovery fails ("" = vendor default)
         self.expiry_date = expiry_date
         self.records_count = records_count
+        self.expiry_policy = expiry_policy
         
     def __str__(self):
-        return f"{self.symbol} (Expiry: {self.expiry_date}, Records: {self.records_count})"
+        expiry = self.expiry_policy if self.expiry_policy else self.expiry_date
+        return f"{self.symbol} (Expiry: {expiry}, Records: {self.records_count})"
 
 class NiftyAPIClient:
-    def __init__(self, symbols_config: Optional[List[SymbolConfig]] = None):
+    def __init__(self, symbols_config: Optional[List[SymbolConfig]] = None,
+                 proxy_pool: Optional[ProxyPool] = None, url: str = API_URL, proxy_attempts: int = 3):
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
             "Accept": "application/json",
             "Accept-Encoding": "gzip, deflate, br",
             "Connection": "keep-alive"
         }
-        self.url = "https://webapi.niftytrader.in/webapi/option/option-chain-data"
+        self.url = url
+        
+        # Optional pool of proxies to spread requests over; falls back to a direct connection
+        self.proxy_pool = proxy_pool
+        self.proxy_attempts = proxy_attempts
         
         # Default configuration if none provided
         self.symbols_config = symbols_config or [
             SymbolConfig("nifty", "2025-04-24", 20)
         ]
         
+        # Expiry lists discovered per symbol, refreshed once per trading session
+        self.expiry_cache = ExpiryCache()
+        # Default-expiry chains fetched by this cycle's discovery, reused instead of refetching
+        self.discovered_chains: Dict[str, Dict[str, Any]] = {}
+        # (session date, symbol, warning) already printed, so retries don't repeat them
+        self.expiry_warnings = set()
+        
         # Create a session with retry logic
         self.session = requests.Session()
         retries = Retry(
@@ -38,30 +62,62 @@ class NiftyAPIClient:
         )
         self.session.mount('https://', HTTPAdapter(max_retries=retries))
         
-    def fetch_option_chain_for_symbol(self, config: SymbolConfig) -> Optional[Dict[str, Any]]:
-        """Fetch option chain data for a single symbol"""
+    def _request(self, session: requests.Session, params: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        response = session.get(
+            self.url, 
+            headers=self.headers, 
+            params=params,
+            timeout=(5, 15)  # 5s connect timeout, 15s read timeout
+        )
+        response.raise_for_status()
+        data = response.json()
+        
+        if data["result"] == 1 and data["resultMessage"] == "Success":
+            return data["resultData"]
+        return None
+        
+    def _fetch_via_proxy(self, config: SymbolConfig, params: Dict[str, str]) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """Try up to proxy_attempts different proxies. Returns (answered, data)"""
+        tried = set()
+        for _ in range(self.proxy_attempts):
+            proxy = self.proxy_pool.acquire(exclude=tried)
+            if proxy is None:
+                break
+            tried.add(proxy.address)
+            
+            start = time.monotonic()
+            try:
+                result = self._request(proxy.session, params)
+            except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+                # Proxies often return HTML error pages, so parse errors count against them too
+                self.proxy_pool.release(proxy, time.monotonic() - start, False)
+                print(f"Error fetching data for {config.symbol} via proxy {proxy.address}: {e}")
+                continue
+            
+            self.proxy_pool.release(proxy, time.monotonic() - start, True)
+            return True, result
+        
+        return False, None
+        
+    def fetch_option_chain_for_symbol(self, config: SymbolConfig,
+                                      expiry_date: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Fetch option chain data for a single symbol and expiry (defaults to the configured one)"""
         params = {
             "symbol": config.symbol,
             "exchange": "nse",
-            "expiryDate": config.expiry_date,
+            "expiryDate": config.expiry_date if expiry_date is None else expiry_date,
             # Calculate atmAbove and atmBelow based on records_count
             "atmBelow": str(config.records_count // 2),
             "atmAbove": str(config.records_count // 2)
         }
         
+        if self.proxy_pool is not None:
+            answered, result = self._fetch_via_proxy(config, params)
+            if answered:
+                return result
+        
         try:
-            response = self.session.get(
-                self.url, 
-                headers=self.headers, 
-                params=params,
-                timeout=(5, 15)  # 5s connect timeout, 15s read timeout
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            if data["result"] == 1 and data["resultMessage"] == "Success":
-                return data["resultData"]
-                
+            return self._request(self.session, params)
         except requests.exceptions.RequestException as e:
             print(f"Error fetching data for {config.symbol}: {e}")
             return None
@@ -72,20 +128,99 @@ class NiftyAPIClient:
             print(f"Error decoding JSON for {config.symbol}: {e}")
             return None
         
+    def _map(self, fn, items: List[Any]) -> List[Any]:
+        """Apply fn to every item, concurrently with one request per healthy proxy when pooled"""
+        workers = min(len(items), self.proxy_pool.healthy_count()) if self.proxy_pool else 0
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                return list(executor.map(fn, items))
+        return [fn(item) for item in items]
+        
+    def _discover_expiries(self, config: SymbolConfig) -> Optional[Dict[str, Any]]:
+        """Fetch the default chain, which advertises the symbol's expiries"""
+        return self.fetch_option_chain_for_symbol(config, "")
+        
+    def _warn_once(self, symbol: str, kind: str, message: str) -> None:
+        """Print an expiry warning once per symbol and trading session"""
+        key = (ExpiryCache.session_date(), symbol, kind)
+        if key not in self.expiry_warnings:
+            self.expiry_warnings.add(key)
+            print(message)
+        
+    def resolve_expiries(self) -> List[Tuple[SymbolConfig, str]]:
+        """
+        Expand the configured symbols into (config, expiry) pairs to request.
+        Expiry lists are only fetched for symbols not yet discovered this session.
+        """
+        today = ExpiryCache.session_date()
+        self.discovered_chains = {}
+        to_discover = [config for config in self.symbols_config
+                       if config.expiry_policy and self.expiry_cache.get(config.symbol) is None]
+        for config, result in zip(to_discover, self._map(self._discover_expiries, to_discover)):
+            expiries, complete = extract_expiries(result)
+            # Leave failed discoveries uncached so they are retried next cycle
+            if not expiries:
+                continue
+            self.expiry_cache.set(config.symbol, expiries, complete)
+            self.discovered_chains[config.symbol] = result
+            
+            # Warn once per session, so a short list never goes unnoticed but retries stay quiet
+            policy = config.expiry_policy
+            if not complete:
+                self._warn_once(config.symbol, "incomplete",
+                                f"Warning: no expiry list in the response for {config.symbol}, only found "
+                                f"{', '.join(expiries)} in the returned strikes. Retrying discovery every "
+                                f"{self.expiry_cache.incomplete_retry_seconds / 60:.0f} minutes")
+            selected = policy.select(expiries, today, complete)
+            if len(selected) < policy.count:
+                self._warn_once(config.symbol, "short",
+                                f"Warning: expiry policy '{policy}' for {config.symbol} matched only "
+                                f"{len(selected)} of {policy.count} expiries"
+                                + ("" if selected else f", using {config.expiry_date or 'the default expiry'}"))
+        
+        pairs = []
+        for config in self.symbols_config:
+            expiries = []
+            if config.expiry_policy:
+                expiries, complete = self.expiry_cache.get(config.symbol) or ([], False)
+                expiries = config.expiry_policy.select(expiries, today, complete)
+            for expiry in expiries or [config.expiry_date]:
+                pairs.append((config, expiry))
+        return pairs
+        
+    def _discovered_chain(self, config: SymbolConfig, expiry: str) -> Optional[Dict[str, Any]]:
+        """This cycle's discovery response, if it is the chain requested for this pair"""
+        result = self.discovered_chains.get(config.symbol)
+        if result is None:
+            return None
+        if expiry == "" or parse_expiry(expiry) == parse_expiry(chain_expiry(result)):
+            return result
         return None
         
-    def fetch_option_chain(self) -> Dict[str, Optional[Dict[str, Any]]]:
-        """Fetch option chain data for all configured symbols"""
+    def fetch_option_chain(self) -> Dict[Tuple[str, str], Optional[Dict[str, Any]]]:
+        """
+        Fetch option chain data for every configured (symbol, expiry) pair. Pairs served
+        by this cycle's discovery request (the default expiry) reuse its response.
+        """
+        pairs = self.resolve_expiries()
         results = {}
+        to_fetch = []
+        for config, expiry in pairs:
+            result = self._discovered_chain(config, expiry)
+            if result is not None:
+                results[(config.symbol, expiry)] = result
+            else:
+                to_fetch.append((config, expiry))
         
-        for config in self.symbols_config:
-            results[config.symbol] = self.fetch_option_chain_for_symbol(config)
-                
-        return results
+        fetched = self._map(lambda pair: self.fetch_option_chain_for_symbol(*pair), to_fetch)
+        for (config, expiry), result in zip(to_fetch, fetched):
+            results[(config.symbol, expiry)] = result
+        return {(config.symbol, expiry): results[(config.symbol, expiry)] for config, expiry in pairs}
     
-    def add_symbol(self, symbol: str, expiry_date: str, records_count: int = 20):
+    def add_symbol(self, symbol: str, expiry_date: str = "", records_count: int = 20,
+                   expiry_policy: Optional[ExpiryPolicy] = None):
         """Add a new symbol configuration"""
-        config = SymbolConfig(symbol, expiry_date, records_count)
+        config = SymbolConfig(symbol, expiry_date, records_count, expiry_policy)
         self.symbols_config.append(config)
         
     def remove_symbol(self, symbol: str):
@@ -93,7 +228,8 @@ class NiftyAPIClient:
         symbol = symbol.lower()
         self.symbols_config = [config for config in self.symbols_config if config.symbol != symbol]
         
-    def update_symbol(self, symbol: str, expiry_date: Optional[str] = None, records_count: Optional[int] = None):
+    def update_symbol(self, symbol: str, expiry_date: Optional[str] = None, records_count: Optional[int] = None,
+                      expiry_policy: Optional[ExpiryPolicy] = None):
         """Update configuration for an existing symbol"""
         symbol = symbol.lower()
         for config in self.symbols_config:
@@ -102,6 +238,8 @@ class NiftyAPIClient:
                     config.expiry_date = expiry_date
                 if records_count is not None:
                     config.records_count = records_count
+                if expiry_policy is not None:
+                    config.expiry_policy = expiry_policy
                 return True
         return False
         
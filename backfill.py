@@ -0,0 +1,289 @@
+import argparse
+import gzip
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from typing import Dict, Any, List, Iterator, Optional, Set, Tuple
+
+from formatters import get_middle_slice, parse_option_record, format_totals
+from analytics import ChainAnalytics
+from db_handler import MongoDBHandler, insert_ignoring_duplicates
+
+SUPPORTED_SUFFIXES = (".json", ".jsonl", ".json.gz", ".jsonl.gz")
+
+# One snapshot as produced by a worker: (totals document, strike documents)
+Snapshot = Tuple[Dict[str, Any], List[Dict[str, Any]]]
+
+# Unreadable input (bad JSON or encoding, truncated or corrupt gzip, I/O errors).
+# gzip.BadGzipFile is an OSError and JSONDecodeError/UnicodeDecodeError are ValueErrors
+READ_ERRORS = (ValueError, EOFError, OSError)
+
+def find_input_files(input_dir: str) -> List[str]:
+    """List all supported dump files under input_dir in a stable order"""
+    paths = []
+    for root, _, files in os.walk(input_dir):
+        for name in files:
+            if name.endswith(SUPPORTED_SUFFIXES):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+def _open_dump(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+def _iter_payloads(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield every JSON object in a dump file (one document, a list, or JSON lines)"""
+    with _open_dump(path) as f:
+        if ".jsonl" in os.path.basename(path):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            payload = json.load(f)
+            if isinstance(payload, list):
+                yield from payload
+            else:
+                yield payload
+
+def _snapshot_timestamp(payload: Dict[str, Any], time_value: Any, fallback: datetime) -> datetime:
+    """Best-effort collection time: explicit timestamp, then the vendor time field, then file mtime"""
+    for candidate in (payload.get("timestamp"), time_value):
+        if candidate:
+            try:
+                return datetime.fromisoformat(str(candidate))
+            except ValueError:
+                continue
+    return fallback
+
+def parse_dump_file(path: str, records_count: int = 0) -> Tuple[str, List[Snapshot], Optional[str]]:
+    """
+    Parse and format one archived dump file. Runs in a worker process.
+    Accepts raw API responses ({"result", "resultData"}) or bare resultData objects.
+    Returns the snapshots read and, if the file could not be read to the end, the error;
+    snapshots before the error are still returned.
+    """
+    analytics = ChainAnalytics()
+    snapshots = []
+
+    try:
+        file_time = datetime.fromtimestamp(os.path.getmtime(path))
+        for payload in _iter_payloads(path):
+            snapshot = _parse_snapshot(path, payload, records_count, file_time, analytics)
+            if snapshot is not None:
+                snapshots.append(snapshot)
+    except READ_ERRORS as e:
+        return path, snapshots, f"{type(e).__name__}: {e}"
+
+    return path, snapshots, None
+
+def _parse_snapshot(path: str, payload: Any, records_count: int, file_time: datetime,
+                    analytics: ChainAnalytics) -> Optional[Snapshot]:
+    if not isinstance(payload, dict):
+        print(f"Skipping non-object payload in {path}")
+        return None
+
+    result_data = payload.get("resultData", payload)
+    if not isinstance(result_data, dict) or not result_data.get("opDatas"):
+        return None
+
+    options = result_data["opDatas"]
+    if records_count:
+        options = get_middle_slice(options, records_count)
+
+    try:
+        records = [parse_option_record(option) for option in options]
+        totals = format_totals(result_data["opTotals"])
+    except (KeyError, TypeError, AttributeError) as e:
+        print(f"Skipping malformed snapshot in {path}: {e}")
+        return None
+
+    timestamp = _snapshot_timestamp(payload, records[0].time, file_time)
+    totals_document = {'timestamp': timestamp, 'data': totals}
+    # Dumps hold distinct archived snapshots, so each one becomes the next baseline
+    chain_key = f"{records[0].symbol} {records[0].expiry}"
+    chain_analytics = analytics.compute(chain_key, records)
+    analytics.commit(chain_key, chain_analytics)
+    if chain_analytics is not None:
+        totals_document['analytics'] = chain_analytics
+
+    return totals_document, [record.to_document(timestamp) for record in records]
+
+class Checkpoint:
+    """
+    Append-only list of fully imported files, used to resume after a crash.
+    Files that could not be read are listed with their error in <checkpoint>.failed
+    and are not marked completed, so a rerun tries them again.
+    """
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.completed: Set[str] = set()
+        self.failed: List[str] = []
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.completed = {line.strip() for line in f if line.strip()}
+
+    @property
+    def failed_path(self) -> Optional[str]:
+        return f"{self.path}.failed" if self.path else None
+
+    def mark_failed(self, file: str, error: str) -> None:
+        self.failed.append(file)
+        if not self.path:
+            return
+        with open(self.failed_path, "a", encoding="utf-8") as f:
+            f.write(f"{datetime.now().isoformat()}\t{file}\t{error}\n")
+
+    def mark_completed(self, files: List[str]) -> None:
+        self.completed.update(files)
+        if not self.path or not files:
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(f"{name}\n" for name in files))
+            f.flush()
+            os.fsync(f.fileno())
+
+class BulkImporter:
+    """
+    Writes formatted snapshots with large unordered batches. Deduplication is left to the
+    unique index on (symbol, expiry, strike_price, time), so no set of keys is kept in
+    memory and re-importing a file after a crash is harmless.
+    """
+    def __init__(self, db_handler: MongoDBHandler, checkpoint: Checkpoint, batch_size: int = 10000):
+        self.db_handler = db_handler
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+        self.strike_buffer: List[Dict[str, Any]] = []
+        # Buffered totals with the range of strike_buffer holding their strike documents
+        self.totals_buffer: List[Tuple[Dict[str, Any], int, int]] = []
+        # Files whose documents are (partly) in the buffers and not yet flushed
+        self.pending_files: List[str] = []
+        self.inserted = 0
+        self.duplicates = 0
+
+    def add_file(self, path: str, snapshots: List[Snapshot], completed: bool = True) -> None:
+        """Buffer a file's snapshots; only completed files are checkpointed on flush"""
+        for totals_document, strike_documents in snapshots:
+            start = len(self.strike_buffer)
+            self.strike_buffer.extend(strike_documents)
+            self.totals_buffer.append((totals_document, start, len(self.strike_buffer)))
+
+        if completed:
+            self.pending_files.append(path)
+        if len(self.strike_buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write buffered documents, then checkpoint the files they came from"""
+        duplicates = set()
+        for start in range(0, len(self.strike_buffer), self.batch_size):
+            skipped = insert_ignoring_duplicates(
+                self.db_handler.strike_collection, self.strike_buffer[start:start + self.batch_size]
+            )
+            duplicates.update(start + index for index in skipped)
+
+        # Mirror save_data: totals are only stored alongside new strike documents
+        totals = [
+            totals_document for totals_document, start, end in self.totals_buffer
+            if any(index not in duplicates for index in range(start, end))
+        ]
+        if totals:
+            self.db_handler.totals_collection.insert_many(totals, ordered=False)
+
+        self.inserted += len(self.strike_buffer) - len(duplicates)
+        self.duplicates += len(duplicates)
+        self.checkpoint.mark_completed(self.pending_files)
+        print(f"Flushed {len(self.strike_buffer)} strike documents from {len(self.pending_files)} files "
+              f"({self.inserted} inserted, {self.duplicates} duplicates so far)")
+
+        self.strike_buffer = []
+        self.totals_buffer = []
+        self.pending_files = []
+
+def run_backfill(input_dir: str, workers: Optional[int] = None, batch_size: int = 10000,
+                 records_count: int = 0, defer_indexes: bool = False,
+                 checkpoint_path: Optional[str] = None) -> None:
+    checkpoint = Checkpoint(checkpoint_path)
+    files = [path for path in find_input_files(input_dir) if path not in checkpoint.completed]
+    print(f"Found {len(files)} files to import ({len(checkpoint.completed)} already completed)")
+    if not files:
+        return
+
+    db_handler = MongoDBHandler(create_indexes=not defer_indexes)
+    workers = workers or os.cpu_count() or 1
+
+    try:
+        # Deduplication relies on the unique index, so it is built first even with --defer-indexes
+        if not db_handler.ensure_record_key_index():
+            print("Aborting backfill: duplicates can't be skipped without the unique index")
+            return
+        importer = BulkImporter(db_handler, checkpoint, batch_size)
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Keep a bounded number of parsed files in flight so memory stays flat
+            remaining = iter(files)
+            in_flight = {}
+            for path in remaining:
+                in_flight[executor.submit(parse_dump_file, path, records_count)] = path
+                if len(in_flight) >= workers * 2:
+                    break
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = in_flight.pop(future)
+                    try:
+                        _, snapshots, error = future.result()
+                    except Exception as e:
+                        snapshots, error = [], f"{type(e).__name__}: {e}"
+
+                    # A bad file is logged and skipped; whatever was read before the error is kept
+                    if error:
+                        print(f"Error reading {path}: {error}")
+                        checkpoint.mark_failed(path, error)
+                    importer.add_file(path, snapshots, completed=error is None)
+
+                    next_path = next(remaining, None)
+                    if next_path is not None:
+                        in_flight[executor.submit(parse_dump_file, next_path, records_count)] = next_path
+
+        importer.flush()
+
+        if defer_indexes:
+            print("Building indexes...")
+            db_handler.ensure_indexes()
+
+        print(f"Backfill complete - {importer.inserted} strike documents inserted, "
+              f"{importer.duplicates} duplicates skipped")
+        if checkpoint.failed:
+            location = f", see {checkpoint.failed_path}" if checkpoint.failed_path else ""
+            print(f"{len(checkpoint.failed)} files could not be read completely{location}")
+    finally:
+        db_handler.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import archived option chain JSON dumps into MongoDB")
+    parser.add_argument("input_dir", help="Directory of .json, .jsonl (optionally .gz) API dumps")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Documents per insert_many batch")
+    parser.add_argument("--records-count", type=int, default=0,
+                        help="Keep only the middle N strikes per snapshot, like the collector (default: all)")
+    parser.add_argument("--defer-indexes", action="store_true",
+                        help="Build only the unique deduplication index up front, the rest once all data is loaded")
+    parser.add_argument("--checkpoint", default="backfill.checkpoint",
+                        help="File recording completed inputs, used to resume after a crash")
+    args = parser.parse_args()
+
+    run_backfill(
+        args.input_dir,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        records_count=args.records_count,
+        defer_indexes=args.defer_indexes,
+        checkpoint_path=args.checkpoint
+    )
+
+if __name__ == "__main__":
+    main()
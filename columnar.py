@@ -0,0 +1,102 @@
+import pyarrow as pa
+from datetime import datetime
+from typing import Dict, Any, List
+
+from records import OptionRecord, OptionLeg, GREEK_FIELDS
+
+# Leg field display name (as stored in MongoDB) -> flat column suffix
+LEG_COLUMNS = (
+    ("OI", "oi"),
+    ("Change in OI", "change_oi"),
+    ("Volume", "volume"),
+    ("IV", "iv"),
+    ("LTP", "ltp"),
+    ("Net Change", "net_change"),
+    ("Bid Price", "bid_price"),
+    ("Ask Price", "ask_price"),
+    ("Open", "open"),
+    ("High", "high"),
+    ("Low", "low"),
+    ("OI Value", "oi_value"),
+    ("Change OI Value", "change_oi_value"),
+    ("Average Price", "average_price"),
+    ("Buildup", "buildup"),
+    ("Intrinsic", "intrinsic"),
+    ("Time Value", "time_value"),
+)
+
+def _leg_schema(side: str) -> List[pa.Field]:
+    fields = [
+        pa.field(f"{side}_{column}", pa.string() if column == "buildup" else pa.float64())
+        for _, column in LEG_COLUMNS
+    ]
+    fields.extend(pa.field(f"{side}_{greek}", pa.float64()) for greek, _ in GREEK_FIELDS)
+    # Recomputed values (RECOMPUTE_GREEKS); null when not computed or not solvable
+    fields.append(pa.field(f"{side}_model_iv", pa.float64()))
+    fields.extend(pa.field(f"{side}_model_{greek}", pa.float64()) for greek, _ in GREEK_FIELDS)
+    return fields
+
+# Flat schema shared by the retention archive and the columnar spool sink
+STRIKE_SCHEMA = pa.schema([
+    pa.field("timestamp", pa.timestamp("ms")),
+    pa.field("symbol", pa.string()),
+    pa.field("expiry", pa.string()),
+    pa.field("strike_price", pa.float64()),
+    pa.field("time", pa.string()),
+    pa.field("pcr", pa.float64()),
+    pa.field("index_close", pa.float64()),
+] + _leg_schema("calls") + _leg_schema("puts"))
+
+def _flatten_leg(row: Dict[str, Any], side: str, leg: Dict[str, Any]) -> None:
+    for name, column in LEG_COLUMNS:
+        row[f"{side}_{column}"] = leg.get(name)
+    greeks = leg.get("Greeks") or {}
+    model_greeks = leg.get("Model Greeks") or {}
+    for greek, name in GREEK_FIELDS:
+        row[f"{side}_{greek}"] = greeks.get(name)
+        row[f"{side}_model_{greek}"] = model_greeks.get(name)
+    row[f"{side}_model_iv"] = leg.get("Model IV")
+
+def flatten_strike_document(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a strike_prices document into a single row matching STRIKE_SCHEMA"""
+    row = {
+        "timestamp": document.get("timestamp"),
+        "symbol": document.get("symbol"),
+        "expiry": None if document.get("expiry") is None else str(document["expiry"]),
+        "strike_price": document.get("strike_price"),
+        "time": None if document.get("time") is None else str(document["time"]),
+        "pcr": document.get("pcr"),
+        "index_close": document.get("index_close"),
+    }
+    _flatten_leg(row, "calls", document.get("calls") or {})
+    _flatten_leg(row, "puts", document.get("puts") or {})
+    return row
+
+def _leg_row(row: Dict[str, Any], side: str, leg: OptionLeg) -> None:
+    # Column suffixes are the OptionLeg slot names
+    for _, column in LEG_COLUMNS:
+        row[f"{side}_{column}"] = getattr(leg, column)
+    model_greeks = leg.model_greeks or {}
+    for greek, _ in GREEK_FIELDS:
+        row[f"{side}_{greek}"] = getattr(leg, greek)
+        row[f"{side}_model_{greek}"] = model_greeks.get(greek)
+    row[f"{side}_model_iv"] = leg.model_iv
+
+def record_to_row(record: OptionRecord, timestamp: datetime) -> Dict[str, Any]:
+    """Flatten a record straight into a STRIKE_SCHEMA row without building the nested document"""
+    row = {
+        "timestamp": timestamp,
+        "symbol": record.symbol,
+        "expiry": None if record.expiry is None else str(record.expiry),
+        "strike_price": record.strike_price,
+        "time": None if record.time is None else str(record.time),
+        "pcr": record.pcr,
+        "index_close": record.index_close,
+    }
+    _leg_row(row, "calls", record.calls)
+    _leg_row(row, "puts", record.puts)
+    return row
+
+def rows_to_table(rows: List[Dict[str, Any]]) -> pa.Table:
+    """Build an Arrow table with the fixed strike schema, so every file and row group agree"""
+    return pa.Table.from_pylist(rows, schema=STRIKE_SCHEMA)
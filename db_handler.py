@@ -1,10 +1,37 @@
 from pymongo import MongoClient, ASCENDING
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError, OperationFailure
 from datetime import datetime
 import os
-from typing import Dict, Any, List, Set, Tuple
+from typing import Dict, Any, List, Set, Optional
 
-class MongoDBHandler:
-    def __init__(self):
+from records import OptionRecord, RecordKey
+from sinks import DataSink, filter_new_records
+
+# Deduplication key of strike_prices, matching OptionRecord.key
+RECORD_KEY_INDEX = [("symbol", ASCENDING), ("expiry", ASCENDING),
+                    ("strike_price", ASCENDING), ("time", ASCENDING)]
+
+DUPLICATE_KEY_ERROR = 11000
+
+def insert_ignoring_duplicates(collection: Collection, documents: List[Dict[str, Any]]) -> List[int]:
+    """
+    Insert documents unordered, so one duplicate doesn't stop the rest of the batch.
+    Returns the indexes of documents rejected by a unique index; other errors are raised.
+    """
+    if not documents:
+        return []
+    try:
+        collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if e.details.get("writeConcernErrors") or any(error["code"] != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        return [error["index"] for error in errors]
+    return []
+
+class MongoDBHandler(DataSink):
+    def __init__(self, create_indexes: bool = True, db_name: str = 'nifty_options'):
         mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
         # Add connection pooling configuration
         self.client = MongoClient(
@@ -15,97 +42,111 @@ class MongoDBHandler:
             connectTimeoutMS=5000,  # How long to wait for a connection to be established
             serverSelectionTimeoutMS=5000  # How long to wait for server selection
         )
-        self.db = self.client['nifty_options']
+        self.db = self.client[db_name]
         self.strike_collection = self.db['strike_prices']
         self.totals_collection = self.db['totals_data']
         
-        # Create indexes for faster querying
+        # Bulk loads can skip this and build indexes once at the end
+        if create_indexes:
+            self.ensure_indexes()
+    
+    def ensure_indexes(self) -> None:
+        """Create indexes for faster querying"""
         self.strike_collection.create_index([("timestamp", ASCENDING)])
         self.strike_collection.create_index([("strike_price", ASCENDING)])
         self.strike_collection.create_index([("strike_price", ASCENDING), ("timestamp", ASCENDING)])
         self.strike_collection.create_index([("strike_price", ASCENDING), ("time", ASCENDING)])
+        self.ensure_record_key_index()
         
         self.totals_collection.create_index([("timestamp", ASCENDING)])
     
-    def get_existing_records(self) -> Set[Tuple[float, str]]:
+    def ensure_record_key_index(self) -> bool:
         """
-        Get all existing strike price and time combinations from the database
-        Returns a set of tuples (strike_price, time)
+        Unique index on (symbol, expiry, strike_price, time), so records that are already
+        stored are rejected by MongoDB. Returns False if it could not be built, e.g.
+        because the collection already holds duplicates.
+        """
+        name = "_".join(f"{field}_{direction}" for field, direction in RECORD_KEY_INDEX)
+        try:
+            # Replace the earlier non-unique index on the same key
+            existing = self.strike_collection.index_information().get(name)
+            if existing and not existing.get("unique"):
+                self.strike_collection.drop_index(name)
+            self.strike_collection.create_index(RECORD_KEY_INDEX, name=name, unique=True)
+            return True
+        except OperationFailure as e:
+            print(f"Error creating unique index on symbol, expiry, strike price and time: {e}")
+            return False
+    
+    def get_existing_records(self) -> Set[RecordKey]:
+        """
+        Get all existing symbol, expiry, strike price and time combinations from the database
+        Returns a set of tuples (symbol, expiry, strike_price, time)
         """
         existing_records = set()
-        cursor = self.strike_collection.find({}, {"strike_price": 1, "time": 1, "_id": 0})
+        cursor = self.strike_collection.find({}, {"symbol": 1, "expiry": 1, "strike_price": 1, "time": 1, "_id": 0})
         
         for doc in cursor:
             if "strike_price" in doc and "time" in doc:
-                existing_records.add((doc["strike_price"], doc["time"]))
+                existing_records.add((doc.get("symbol"), doc.get("expiry"), doc["strike_price"], doc["time"]))
         
         print(f"Loaded {len(existing_records)} existing records from database")
         return existing_records
     
-    def save_data(self, options_data: List[Dict[str, Any]], totals_data: Dict[str, Any], 
-                  existing_records: Set[Tuple[float, str]]) -> Set[Tuple[float, str]]:
+    def write(self, records: List[OptionRecord], totals_data: Dict[str, Any], timestamp: datetime,
+              analytics: Optional[Dict[str, Any]] = None) -> None:
         """
-        Save options and totals data to MongoDB with timestamp.
+        Insert already deduplicated records and their totals.
         Each strike price is saved as a separate document for easier querying.
+        Derived analytics, if provided, are stored on the totals document.
+        """
+        if not records:
+            return
+        
+        # Another writer (e.g. a backfill) may already have stored some of these
+        skipped = insert_ignoring_duplicates(
+            self.strike_collection, [record.to_document(timestamp) for record in records]
+        )
+        if len(skipped) == len(records):
+            return
+        
+        # Save totals data only if we have new strike documents
+        totals_document = {
+            'timestamp': timestamp,
+            'data': totals_data
+        }
+        if analytics is not None:
+            totals_document['analytics'] = analytics
+        self.totals_collection.insert_one(totals_document)
+    
+    def save_data(self, options_data: List[OptionRecord], totals_data: Dict[str, Any], 
+                  existing_records: Set[RecordKey],
+                  analytics: Optional[Dict[str, Any]] = None) -> Set[RecordKey]:
+        """
+        Save options and totals data to MongoDB with timestamp, skipping known records.
         Returns updated set of existing records.
         """
         timestamp = datetime.now()
+        new_records, duplicate_records = filter_new_records(options_data, existing_records)
         
-        # Save each strike price as a separate document
-        strike_documents = []
-        new_records_added = 0
-        duplicate_records = 0
-        
-        for option in options_data:
-            strike_price = option['Strike Price']
-            time_value = option['Time']
-            
-            # Skip if this strike price and time combination already exists
-            if (strike_price, time_value) in existing_records:
-                duplicate_records += 1
-                continue
-                
-            # This is a new record, add to the list for insertion
-            strike_document = {
-                'timestamp': timestamp,
-                'strike_price': strike_price,
-                'expiry': option['Expiry'],
-                'pcr': option['PCR'],
-                'symbol': option['Symbol'],
-                'index_close': option['Index Close'],
-                'time': time_value,
-                'calls': option['Calls'],
-                'puts': option['Puts']
-            }
-            strike_documents.append(strike_document)
-            
-            # Add to the set of existing records
-            existing_records.add((strike_price, time_value))
-            new_records_added += 1
-        
-        # Insert all new strike documents
-        if strike_documents:
-            self.strike_collection.insert_many(strike_documents)
-            
-            # Save totals data only if we have new strike documents
-            totals_document = {
-                'timestamp': timestamp,
-                'data': totals_data
-            }
-            self.totals_collection.insert_one(totals_document)
-            
-            print(f"Data saved to MongoDB at {timestamp} - {new_records_added} new strike prices")
+        if new_records:
+            self.write(new_records, totals_data, timestamp, analytics)
+            print(f"Data saved to MongoDB at {timestamp} - {len(new_records)} new strike prices")
         else:
             print(f"No new records to save at {timestamp} - Found {duplicate_records} duplicate records")
         
         return existing_records
     
-    def query_strike_price(self, strike_price: float, start_time=None, end_time=None):
+    def query_strike_price(self, strike_price: float, start_time=None, end_time=None,
+                           expiry: Optional[str] = None):
         """
-        Query data for a specific strike price with optional time range.
+        Query data for a specific strike price with optional time range and expiry
+        (as stored, e.g. "2025-04-24T00:00:00"), so several expiries of a symbol don't mix.
         Returns data in chronological order.
         """
         query = {"strike_price": strike_price}
+        if expiry is not None:
+            query["expiry"] = expiry
         
         # Add time range if provided
         if start_time or end_time:
@@ -117,15 +158,18 @@ class MongoDBHandler:
         
         return list(self.strike_collection.find(query).sort("timestamp", ASCENDING))
     
-    def batch_query_strike_prices(self, strike_prices: List[float], start_time=None, end_time=None, batch_size=100):
+    def batch_query_strike_prices(self, strike_prices: List[float], start_time=None, end_time=None, batch_size=100,
+                                  expiry: Optional[str] = None):
         """
-        Query data for multiple strike prices with optional time range.
+        Query data for multiple strike prices with optional time range and expiry.
         Uses batching to efficiently retrieve large datasets.
         """
         all_results = []
         
         # Create base query
         base_query = {}
+        if expiry is not None:
+            base_query["expiry"] = expiry
         if start_time or end_time:
             base_query["timestamp"] = {}
             if start_time:
@@ -144,11 +188,14 @@ class MongoDBHandler:
         
         return all_results
         
-    def get_strike_price_stats(self, strike_price: float, start_time=None, end_time=None):
+    def get_strike_price_stats(self, strike_price: float, start_time=None, end_time=None,
+                               expiry: Optional[str] = None):
         """
-        Get aggregate statistics for a specific strike price over time
+        Get aggregate statistics for a specific strike price over time, optionally for one expiry
         """
         query = {"strike_price": strike_price}
+        if expiry is not None:
+            query["expiry"] = expiry
         
         # Add time range if provided
         if start_time or end_time:
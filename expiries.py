@@ -0,0 +1,120 @@
+import time
+from datetime import datetime, date
+from typing import Dict, Any, List, Optional, Tuple
+
+import pytz
+
+IST = pytz.timezone('Asia/Kolkata')
+
+# Keys under which the option chain response may list the available expiries
+EXPIRY_LIST_KEYS = ("opExpiryDates", "expiryDates", "expiry_dates")
+
+EXPIRY_FORMATS = ("%Y-%m-%d", "%d-%b-%Y", "%d %b %Y", "%d-%m-%Y")
+
+# Lists read from the returned strikes only hold the default expiry; retry discovery this often
+INCOMPLETE_RETRY_SECONDS = 900
+
+def parse_expiry(value: Any) -> Optional[date]:
+    """Parse a vendor expiry value ("2025-04-24", "2025-04-24T00:00:00", "24-Apr-2025", ...)"""
+    if not value:
+        return None
+    text = str(value).strip()
+    for candidate in (text[:10], text):
+        for expiry_format in EXPIRY_FORMATS:
+            try:
+                return datetime.strptime(candidate, expiry_format).date()
+            except ValueError:
+                continue
+    return None
+
+def extract_expiries(result_data: Optional[Dict[str, Any]]) -> Tuple[List[str], bool]:
+    """
+    Expiry dates (as "YYYY-MM-DD") advertised by an option chain response, and whether
+    the list is complete. When the response has no expiry list, falls back to the
+    expiries of the returned strikes, which only cover the default expiry (incomplete).
+    """
+    if not result_data:
+        return [], False
+
+    values = []
+    complete = False
+    for key in EXPIRY_LIST_KEYS:
+        if result_data.get(key):
+            for item in result_data[key]:
+                values.append(item.get("expiry_date") if isinstance(item, dict) else item)
+            complete = True
+            break
+    else:
+        values = [option.get("expiry_date") for option in result_data.get("opDatas") or []]
+
+    parsed = {parse_expiry(value) for value in values}
+    return sorted(expiry.strftime("%Y-%m-%d") for expiry in parsed if expiry), complete
+
+def chain_expiry(result_data: Optional[Dict[str, Any]]) -> Optional[str]:
+    """The expiry (as "YYYY-MM-DD") of the strikes in an option chain response, if they share one"""
+    if not result_data:
+        return None
+    parsed = {parse_expiry(option.get("expiry_date")) for option in result_data.get("opDatas") or []}
+    if len(parsed) != 1 or None in parsed:
+        return None
+    return parsed.pop().strftime("%Y-%m-%d")
+
+class ExpiryPolicy:
+    """Which expiries of a symbol to collect: the nearest `count` weekly or monthly expiries"""
+    __slots__ = ("count", "kind")
+
+    def __init__(self, count: int = 1, kind: str = "weekly"):
+        if kind not in ("weekly", "monthly"):
+            raise ValueError(f"Unknown expiry policy kind: {kind}")
+        self.count = count
+        self.kind = kind
+
+    def select(self, expiries: List[str], today: date, complete: bool = True) -> List[str]:
+        """
+        Pick expiries from a discovered list, skipping any that have already passed.
+        Monthly expiries can't be told apart from weeklies in an incomplete list, so
+        nothing is selected from one (callers fall back to their fixed expiry).
+        """
+        upcoming = sorted({d for d in (parse_expiry(e) for e in expiries) if d and d >= today})
+
+        if self.kind == "monthly":
+            if not complete:
+                return []
+            # The monthly contract is the last expiry of each calendar month
+            last_in_month: Dict[Tuple[int, int], date] = {}
+            for expiry in upcoming:
+                last_in_month[(expiry.year, expiry.month)] = expiry
+            upcoming = sorted(last_in_month.values())
+
+        return [expiry.strftime("%Y-%m-%d") for expiry in upcoming[:self.count]]
+
+    def __str__(self):
+        return f"nearest {self.count} {self.kind}"
+
+class ExpiryCache:
+    """
+    Discovered expiry lists per symbol, valid for one trading session (IST date).
+    Incomplete lists are only kept for INCOMPLETE_RETRY_SECONDS, so discovery is
+    retried without adding a request to every cycle.
+    """
+    def __init__(self, incomplete_retry_seconds: float = INCOMPLETE_RETRY_SECONDS):
+        self.incomplete_retry_seconds = incomplete_retry_seconds
+        # symbol -> (session date, expiries, complete, monotonic time the entry expires or None)
+        self.entries: Dict[str, Tuple[date, List[str], bool, Optional[float]]] = {}
+
+    @staticmethod
+    def session_date() -> date:
+        return datetime.now(IST).date()
+
+    def get(self, symbol: str) -> Optional[Tuple[List[str], bool]]:
+        """Cached (expiries, complete) for this session, or None if discovery is due"""
+        entry = self.entries.get(symbol)
+        if not entry or entry[0] != self.session_date():
+            return None
+        if entry[3] is not None and time.monotonic() >= entry[3]:
+            return None
+        return entry[1], entry[2]
+
+    def set(self, symbol: str, expiries: List[str], complete: bool = True) -> None:
+        expires_at = None if complete else time.monotonic() + self.incomplete_retry_seconds
+        self.entries[symbol] = (self.session_date(), expiries, complete, expires_at)
@@ -3,10 +3,15 @@ import socketserver
 import threading
 import json
 from datetime import datetime
+from typing import Optional
+from urllib.parse import urlparse, parse_qs
+
+from profiler import CycleProfiler, MAX_PROFILE_CYCLES
 
 class HealthServer:
-    def __init__(self, port=8000):
+    def __init__(self, port=8000, profiler: Optional[CycleProfiler] = None):
         self.port = port
+        self.profiler = profiler
         self.server = None
         self.server_thread = None
         self.is_running = False
@@ -18,11 +23,54 @@ class HealthServer:
             
         # Create handler
         handler = http.server.SimpleHTTPRequestHandler
+        profiler = self.profiler
         
-        # Custom handler that only responds to /health
+        # Custom handler that only responds to /health and /profile
         class HealthCheckHandler(handler):
+            def send_json(self, status, data):
+                self.send_response(status)
+                self.send_header('Content-type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps(data).encode())
+                
+            def send_not_found(self):
+                self.send_response(404)
+                self.send_header('Content-type', 'text/plain')
+                self.end_headers()
+                self.wfile.write(b'Not Found')
+                
+            def do_POST(self):
+                # POST /profile?cycles=N profiles the next N monitoring cycles
+                url = urlparse(self.path)
+                if url.path != '/profile' or profiler is None:
+                    self.send_not_found()
+                    return
+                
+                try:
+                    cycles = int(parse_qs(url.query).get('cycles', ['5'])[0])
+                except ValueError:
+                    self.send_json(400, {'error': 'cycles must be an integer'})
+                    return
+                if not 1 <= cycles <= MAX_PROFILE_CYCLES:
+                    self.send_json(400, {'error': f'cycles must be between 1 and {MAX_PROFILE_CYCLES}'})
+                    return
+                
+                accepted = profiler.request(cycles)
+                self.send_json(202 if accepted else 409, profiler.status())
+                
+            def do_DELETE(self):
+                # DELETE /profile cancels a pending request or stops the active run early
+                if urlparse(self.path).path != '/profile' or profiler is None:
+                    self.send_not_found()
+                    return
+                
+                cancelled = profiler.cancel()
+                self.send_json(202 if cancelled else 409, profiler.status())
+                
             def do_GET(self):
-                if self.path == '/health':
+                if self.path == '/profile' and profiler is not None:
+                    self.send_json(200, profiler.status())
+                elif self.path == '/health':
                     self.send_response(200)
                     self.send_header('Content-type', 'application/json')
                     self.end_headers()
@@ -1,12 +1,39 @@
+import gc
+import os
 from monitor import OptionsMonitor
 from health_server import HealthServer
 from api_client import SymbolConfig, NiftyAPIClient
+from db_handler import MongoDBHandler
+from parquet_sink import ParquetSink
+from proxy_pool import ProxyPool
+from profiler import CycleProfiler
+
+def create_sinks():
+    """Build output sinks from OUTPUT_SINKS (comma separated: mongo, parquet)"""
+    sinks = []
+    for name in os.getenv('OUTPUT_SINKS', 'mongo').split(','):
+        name = name.strip().lower()
+        if name == 'mongo':
+            sinks.append(MongoDBHandler())
+        elif name == 'parquet':
+            sinks.append(ParquetSink(
+                spool_dir=os.getenv('SPOOL_DIR', 'spool'),
+                row_group_size=int(os.getenv('SPOOL_ROW_GROUP_SIZE', '5000')),
+                flush_interval_seconds=float(os.getenv('SPOOL_FLUSH_SECONDS', '300'))
+            ))
+        elif name:
+            raise ValueError(f"Unknown output sink: {name}")
+    return sinks
 
 if __name__ == "__main__":
+    # Shared by the health server endpoint and the monitor loop
+    profiler = CycleProfiler(output_dir=os.getenv('PROFILE_DIR', 'profiles'))
+    
     # Start health check server for Docker
-    health_server = HealthServer(port=8000)
+    health_server = HealthServer(port=8000, profiler=profiler)
     health_server.start()
     
+    proxy_pool = None
     try:
         # Create configurations for multiple symbols
         symbols_config = [
@@ -64,13 +91,32 @@ if __name__ == "__main__":
             SymbolConfig("wipro", "", 10),  # Wipro
         ]
         
+        # Optionally spread requests over proxies collected by proxy_finder
+        if os.getenv('USE_PROXY_POOL', 'false').lower() == 'true':
+            proxy_pool = ProxyPool(scrape_on_refresh=os.getenv('PROXY_SCRAPE', 'false').lower() == 'true')
+            proxy_pool.refresh()
+        
         # Initialize API client with configurations
-        api_client = NiftyAPIClient(symbols_config)
+        api_client = NiftyAPIClient(symbols_config, proxy_pool=proxy_pool)
         
         # Start the options monitoring with configured symbols
-        monitor = OptionsMonitor(interval_seconds=2)
+        monitor = OptionsMonitor(
+            interval_seconds=2,
+            recompute_greeks=os.getenv('RECOMPUTE_GREEKS', 'false').lower() == 'true',
+            sinks=create_sinks(),
+            profiler=profiler
+        )
         monitor.api_client = api_client  # Use our configured API client
+        
+        # Everything allocated so far (modules, clients and the existing_records set
+        # loaded from MongoDB) lives for the whole process. Freezing it moves it out of
+        # the collector's generations, so full collections during the polling loop
+        # don't have to traverse millions of startup tuples. Done once, after setup.
+        gc.freeze()
+        
         monitor.run()
     finally:
-        # Stop health server on exit
+        # Release proxy connection pools and stop health server on exit
+        if proxy_pool is not None:
+            proxy_pool.close()
         health_server.stop()
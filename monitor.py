@@ -1,19 +1,26 @@
 import json
+import signal
 import time
 import sys
-from typing import Dict, Any, Set, Tuple
+from typing import Dict, Any, List, Optional, Set
 from datetime import datetime, timedelta
 
 from api_client import NiftyAPIClient, SymbolConfig
-from formatters import get_middle_slice, format_option_data, format_totals
+from formatters import get_middle_slice, parse_option_record, format_totals
 from db_handler import MongoDBHandler
+from sinks import DataSink, filter_new_records
 from market_schedule import MarketSchedule
+from records import OptionRecord, RecordKey
+from pricing import enrich_option_chain, DEFAULT_RISK_FREE_RATE
+from analytics import ChainAnalytics
+from profiler import CycleProfiler
 
 class ResponseCache:
     def __init__(self):
         self.previous_responses = {}
     
-    def is_different_response(self, symbol: str, new_response: str) -> bool:
+    def is_different_response(self, symbol: str, new_response: Dict[str, Any]) -> bool:
+        # Compare the decoded response directly instead of building a str() of it every cycle
         if symbol not in self.previous_responses or new_response != self.previous_responses[symbol]:
             self.previous_responses[symbol] = new_response
             return True
@@ -21,30 +28,77 @@ class ResponseCache:
         return False
 
 class OptionsMonitor:
-    def __init__(self, interval_seconds: int = 2):
+    def __init__(self, interval_seconds: int = 2, recompute_greeks: bool = False,
+                 risk_free_rate: float = DEFAULT_RISK_FREE_RATE, sinks: Optional[List[DataSink]] = None,
+                 profiler: Optional[CycleProfiler] = None):
         self.interval_seconds = interval_seconds
+        # Optionally store IV/Greeks recomputed from LTPs next to the vendor values
+        self.recompute_greeks = recompute_greeks
+        self.risk_free_rate = risk_free_rate
         # Initialize with default Nifty configuration
         self.api_client = NiftyAPIClient()
         self.cache = ResponseCache()
-        self.db_handler = MongoDBHandler()
+        # Every snapshot is written to each sink; MongoDB only unless configured otherwise
+        self.sinks = sinks if sinks is not None else [MongoDBHandler()]
+        self.db_handler = next((sink for sink in self.sinks if isinstance(sink, MongoDBHandler)), None)
         self.market_schedule = MarketSchedule()
+        self.analytics = ChainAnalytics()
+        # Idle unless profiling is requested through the health server or SIGUSR1
+        self.profiler = profiler or CycleProfiler()
         self.last_time_display = None
-        # Load existing records from DB once at startup
-        self.existing_records: Set[Tuple[float, str]] = self.db_handler.get_existing_records()
+        # Set by SIGTERM (docker stop) so the loop exits and sinks are closed cleanly
+        self.stop_requested = False
+        # Load existing records from DB once at startup (without MongoDB, dedup is per session)
+        self.existing_records: Set[RecordKey] = (
+            self.db_handler.get_existing_records() if self.db_handler else set()
+        )
 
     def process_data(self, symbol: str, result_data: Dict[str, Any], records_count: int):
         # Get middle N records from opDatas based on configuration
         middle_options = get_middle_slice(result_data["opDatas"], records_count)
         
-        # Format option chain data
-        formatted_data = [format_option_data(option) for option in middle_options]
+        # Decode option chain data into slotted records, converted to documents only on save
+        formatted_data = [parse_option_record(option) for option in middle_options]
         
         # Format totals data
         totals = format_totals(result_data["opTotals"])
         
         return formatted_data, totals
 
-    def print_summary(self, symbol: str, totals: Dict[str, Any], formatted_data: list, new_records: bool):
+    def save_data(self, formatted_data: List[OptionRecord], totals: Dict[str, Any],
+                  analytics: Optional[Dict[str, Any]]) -> int:
+        """Deduplicate once, then hand the new records to every sink. Returns the number saved"""
+        new_records, _ = filter_new_records(formatted_data, self.existing_records)
+        if not new_records:
+            return 0
+        
+        timestamp = datetime.now()
+        for sink in self.sinks:
+            try:
+                sink.write(new_records, totals, timestamp, analytics)
+            except Exception as e:
+                # Keep the other sinks going if one of them fails
+                print(f"\nError writing to {type(sink).__name__}: {e}")
+        
+        return len(new_records)
+
+    def tick_sinks(self):
+        """Let sinks flush on their time thresholds, even when no new records arrive"""
+        for sink in self.sinks:
+            try:
+                sink.tick()
+            except Exception as e:
+                print(f"\nError flushing {type(sink).__name__}: {e}")
+
+    def flush_sinks(self):
+        """Write out everything buffered, e.g. when the market closes"""
+        for sink in self.sinks:
+            try:
+                sink.flush()
+            except Exception as e:
+                print(f"\nError flushing {type(sink).__name__}: {e}")
+
+    def print_summary(self, symbol: str, totals: Dict[str, Any], formatted_data: List[OptionRecord], new_records: bool):
         print(f"\n=== Data Check for {symbol.upper()} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===")
         
         if new_records:
@@ -52,7 +106,7 @@ class OptionsMonitor:
             print("\nOverall Totals:")
             print(json.dumps(totals["Total"], indent=2))
             print("\nFirst Strike Price Data:")
-            print(json.dumps(formatted_data[0], indent=2))
+            print(json.dumps(formatted_data[0].to_dict(), indent=2))
         else:
             print("No new records found. Skipping database update.")
         
@@ -87,9 +141,12 @@ class OptionsMonitor:
         if not self.market_schedule.is_market_open():
             print(f"\nMarket is currently closed. Waiting until market opens...")
             
+            # Finalize the day's files so they can be read while the market is closed
+            self.flush_sinks()
+            
             # Sleep in shorter intervals to allow for keyboard interruption and update the clock
             max_sleep_time = 1  # Update clock every second
-            while not self.market_schedule.is_market_open():
+            while not self.market_schedule.is_market_open() and not self.stop_requested:
                 seconds_until_open = self.market_schedule.time_until_market_open()
                 if seconds_until_open <= 0:
                     break
@@ -99,6 +156,7 @@ class OptionsMonitor:
                 
                 # Update the remaining time display
                 self.display_remaining_time()
+                self.tick_sinks()
                 
                 # Print periodic updates about wait time (every 5 minutes)
                 if seconds_until_open % 300 == 0 and seconds_until_open > 0:
@@ -106,18 +164,32 @@ class OptionsMonitor:
                     print()  # Move to new line after the clock
                     print(f"Still waiting {wait_time} until market opens.")
             
-            print("\nMarket is now open! Starting monitoring...")
+            if not self.stop_requested:
+                print("\nMarket is now open! Starting monitoring...")
             return True
         return False
 
+    def install_profiling_signal(self, cycles: int = 5):
+        """Profile the next cycles when the process receives SIGUSR1 (not available on Windows)"""
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.profiler.request_from_signal(cycles))
+
+    def install_shutdown_signal(self):
+        """Stop after the current cycle on SIGTERM, so buffered sink data is written on docker stop"""
+        def request_stop(signum, frame):
+            self.stop_requested = True
+        signal.signal(signal.SIGTERM, request_stop)
+
     def run(self):
+        self.install_profiling_signal()
+        self.install_shutdown_signal()
         print(f"Starting options monitoring with market hours check...")
         print(f"Loaded {len(self.existing_records)} existing records from database")
         print(f"Monitoring symbols: {', '.join(str(config) for config in self.api_client.symbols_config)}")
         print("Press Ctrl+C to stop monitoring\n")
         
         try:
-            while True:
+            while not self.stop_requested:
                 try:
                     # Display remaining time until market open/close
                     self.display_remaining_time()
@@ -132,16 +204,19 @@ class OptionsMonitor:
                     if seconds_until_close is not None and seconds_until_close < 60:
                         print(f"\nMarket closing in less than 60 seconds. Stopping monitoring.")
                         print("Will resume when market reopens.")
+                        self.flush_sinks()
                         self.wait_for_market_open()
                         continue
                     
                     # Record the start time of the cycle
                     cycle_start_time = time.time()
+                    self.profiler.start_cycle()
                     
-                    # Fetch new data for all symbols
+                    # Fetch new data for every (symbol, expiry) pair
                     results = self.api_client.fetch_option_chain()
                     
-                    for symbol, result_data in results.items():
+                    chains = []
+                    for (symbol, expiry), result_data in results.items():
                         if result_data:
                             # Find the configuration for this symbol
                             symbol_config = next((config for config in self.api_client.symbols_config 
@@ -149,37 +224,39 @@ class OptionsMonitor:
                             if not symbol_config:
                                 continue
 
+                            # Each expiry is tracked as its own chain
+                            chain = f"{symbol} {expiry}" if expiry else symbol
+
                             # Check if response is same as previous
-                            if not self.cache.is_different_response(symbol, str(result_data)):
+                            if not self.cache.is_different_response(chain, result_data):
                                 continue
                                 
                             formatted_data, totals = self.process_data(symbol, result_data, symbol_config.records_count)
-                            
-                            # Check if there are any new records that don't exist in our cached set
-                            has_new_records = False
-                            for option in formatted_data:
-                                strike_price = option['Strike Price']
-                                time_value = option['Time']
-                                if (strike_price, time_value) not in self.existing_records:
-                                    has_new_records = True
-                                    break
-                                
-                            # Only proceed with database operations if we have new records
-                            if has_new_records:
-                                # Update existing records with newly saved ones
-                                self.existing_records = self.db_handler.save_data(
-                                    formatted_data, 
-                                    totals,
-                                    self.existing_records
-                                )
-                                
-                                # Print summary on a new line (after the clock)
-                                print()  # Move to new line after the clock
-                                self.print_summary(symbol, totals, formatted_data, True)
-                            else:
-                                print(f"\n=== Data Check for {symbol.upper()} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===")
-                                print("Skipping database update - All records already exist in database")
-                                print("=" * 50)
+                            chains.append((chain, formatted_data, totals))
+                    
+                    # Recompute IV and Greeks for every changed chain of this cycle in one vectorized pass
+                    if self.recompute_greeks and chains:
+                        enrich_option_chain([record for _, records, _ in chains for record in records],
+                                            self.risk_free_rate)
+                    
+                    for chain, formatted_data, totals in chains:
+                        # Derive max pain, OI walls and PCR once at ingest
+                        analytics = self.analytics.compute(chain, formatted_data)
+                        
+                        # Only records not already in our cached set are written to the sinks
+                        if self.save_data(formatted_data, totals, analytics):
+                            # Changes are only reported against snapshots that were stored
+                            self.analytics.commit(chain, analytics)
+                            # Print summary on a new line (after the clock)
+                            print()  # Move to new line after the clock
+                            self.print_summary(chain, totals, formatted_data, True)
+                        else:
+                            print(f"\n=== Data Check for {chain.upper()} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===")
+                            print("Skipping database update - All records already exist in database")
+                            print("=" * 50)
+                    
+                    self.tick_sinks()
+                    self.profiler.end_cycle()
                     
                     # Calculate how long to wait until next cycle
                     cycle_duration = time.time() - cycle_start_time
@@ -190,9 +267,15 @@ class OptionsMonitor:
                 except KeyboardInterrupt:
                     raise
                 except Exception as e:
+                    self.profiler.end_cycle()
                     print(f"\nError during monitoring: {e}")
                     time.sleep(self.interval_seconds)
         
         finally:
-            self.db_handler.close()
-            print("\nMonitoring stopped by user")
\ No newline at end of file
+            # Close every sink even if one of them fails, so the others still write their buffers
+            for sink in self.sinks:
+                try:
+                    sink.close()
+                except Exception as e:
+                    print(f"\nError closing {type(sink).__name__}: {e}")
+            print("\nMonitoring stopped")
\ No newline at end of file
@@ -0,0 +1,108 @@
+import os
+import re
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+import pyarrow.parquet as pq
+
+from columnar import record_to_row, rows_to_table
+from records import OptionRecord
+from sinks import DataSink
+
+TEMP_SUFFIX = ".inprogress"
+
+class ParquetSink(DataSink):
+    """
+    Spools each snapshot's chain into per-symbol, per-day Parquet part files for research.
+    Rows are buffered and written once either the size or the time threshold is reached.
+    Every flush writes a complete part file, <date>-<n>.parquet, via a temporary
+    .inprogress file that is renamed once its footer is written, so readers only ever
+    see complete files and a crash loses at most the rows still buffered. The time
+    threshold is checked by tick(), which the monitor also calls on cycles without new records.
+    """
+    def __init__(self, spool_dir: str = "spool", row_group_size: int = 5000,
+                 flush_interval_seconds: float = 300):
+        self.spool_dir = spool_dir
+        self.row_group_size = row_group_size
+        self.flush_interval_seconds = flush_interval_seconds
+        # (symbol, day) -> buffered rows, last flush time, last part number written
+        self.buffers: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        self.last_flush: Dict[Tuple[str, str], float] = {}
+        self.parts: Dict[Tuple[str, str], int] = {}
+        self.remove_stale_files()
+
+    def remove_stale_files(self) -> None:
+        """Delete part files left half-written by a crash; their rows were never complete"""
+        if not os.path.isdir(self.spool_dir):
+            return
+        for directory, _, names in os.walk(self.spool_dir):
+            for name in names:
+                if name.endswith(TEMP_SUFFIX):
+                    path = os.path.join(directory, name)
+                    try:
+                        os.remove(path)
+                        print(f"\nRemoved incomplete spool file {path}")
+                    except OSError as e:
+                        print(f"\nError removing incomplete spool file {path}: {e}")
+
+    def _next_part_path(self, symbol: str, day: str) -> str:
+        """Path of the next part file for this symbol and day, continuing after existing parts"""
+        directory = os.path.join(self.spool_dir, symbol)
+        key = (symbol, day)
+        if key not in self.parts:
+            os.makedirs(directory, exist_ok=True)
+            pattern = re.compile(rf"^{re.escape(day)}-(\d+)\.parquet$")
+            numbers = [int(match.group(1)) for match in map(pattern.match, os.listdir(directory)) if match]
+            self.parts[key] = max(numbers, default=0)
+
+        self.parts[key] += 1
+        return os.path.join(directory, f"{day}-{self.parts[key]:04d}.parquet")
+
+    def _flush(self, key: Tuple[str, str]) -> None:
+        rows = self.buffers.get(key)
+        self.last_flush[key] = time.monotonic()
+        if not rows:
+            return
+
+        path = self._next_part_path(*key)
+        temp_path = path + TEMP_SUFFIX
+        pq.write_table(rows_to_table(rows), temp_path, row_group_size=self.row_group_size,
+                       compression="zstd")
+        os.replace(temp_path, path)
+        self.buffers[key] = []
+
+    def write(self, records: List[OptionRecord], totals_data: Dict[str, Any], timestamp: datetime,
+              analytics: Optional[Dict[str, Any]] = None) -> None:
+        if records:
+            day = timestamp.strftime('%Y-%m-%d')
+            for record in records:
+                key = (str(record.symbol).lower(), day)
+                if key not in self.buffers:
+                    self.buffers[key] = []
+                    self.last_flush[key] = time.monotonic()
+                self.buffers[key].append(record_to_row(record, timestamp))
+
+        self.tick()
+
+    def tick(self) -> None:
+        """Write part files that are due and drop the buffers of previous days"""
+        now = time.monotonic()
+        today = datetime.now().strftime('%Y-%m-%d')
+        for key in list(self.buffers):
+            if key[1] < today:
+                self._flush(key)
+                self.buffers.pop(key, None)
+                self.last_flush.pop(key, None)
+                self.parts.pop(key, None)
+            elif (len(self.buffers[key]) >= self.row_group_size
+                  or now - self.last_flush[key] >= self.flush_interval_seconds):
+                self._flush(key)
+
+    def flush(self) -> None:
+        """Write every buffered row to a part file"""
+        for key in list(self.buffers):
+            self._flush(key)
+
+    def close(self) -> None:
+        self.flush()
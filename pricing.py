@@ -0,0 +1,200 @@
+import numpy as np
+import pytz
+from datetime import datetime, time
+from typing import Dict, List, Optional
+
+from records import OptionRecord, GREEK_FIELDS
+
+# NSE options expire at market close on the expiry date
+IST = pytz.timezone('Asia/Kolkata')
+EXPIRY_TIME = time(15, 30, 0)
+
+DEFAULT_RISK_FREE_RATE = 0.065  # Annualised, continuously compounded
+SECONDS_PER_YEAR = 365 * 24 * 3600
+MIN_TIME_TO_EXPIRY = 60 / SECONDS_PER_YEAR  # Floor at one minute to keep d1/d2 finite on expiry day
+
+# Search range for implied volatility (as a fraction, 0.01% to 500%)
+MIN_VOLATILITY = 1e-4
+MAX_VOLATILITY = 5.0
+
+GREEK_DECIMALS = 6  # Gamma on index options is typically ~0.001, so keep more than 4 places
+
+SQRT_2PI = np.sqrt(2 * np.pi)
+
+def _norm_pdf(x: np.ndarray) -> np.ndarray:
+    return np.exp(-0.5 * x * x) / SQRT_2PI
+
+def _norm_cdf(x: np.ndarray) -> np.ndarray:
+    """Standard normal CDF (Abramowitz & Stegun 26.2.17, absolute error < 7.5e-8)"""
+    z = np.abs(x)
+    t = 1.0 / (1.0 + 0.2316419 * z)
+    poly = t * (0.319381530 + t * (-0.356563782 + t * (1.781477937 + t * (-1.821255978 + t * 1.330274429))))
+    upper = 1.0 - _norm_pdf(z) * poly
+    return np.where(x >= 0, upper, 1.0 - upper)
+
+def _d1_d2(S, K, T, r, sigma):
+    sqrt_t = np.sqrt(T)
+    vol_sqrt_t = sigma * sqrt_t
+    d1 = (np.log(S / K) + (r + 0.5 * sigma * sigma) * T) / vol_sqrt_t
+    return d1, d1 - vol_sqrt_t
+
+def black_scholes_price(S, K, T, r: float, sigma, is_call) -> np.ndarray:
+    """Black-Scholes price for arrays of calls and puts"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d1, d2 = _d1_d2(S, K, T, r, sigma)
+        discounted_strike = K * np.exp(-r * T)
+        call = S * _norm_cdf(d1) - discounted_strike * _norm_cdf(d2)
+        put = discounted_strike * _norm_cdf(-d2) - S * _norm_cdf(-d1)
+    return np.where(is_call, call, put)
+
+def black_scholes_greeks(S, K, T, r: float, sigma, is_call) -> Dict[str, np.ndarray]:
+    """
+    Compute all five Greeks for arrays of calls and puts.
+    Theta is per calendar day, Vega and Rho are per 1% move in volatility/rate.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d1, d2 = _d1_d2(S, K, T, r, sigma)
+        sqrt_t = np.sqrt(T)
+        pdf_d1 = _norm_pdf(d1)
+        discounted_strike = K * np.exp(-r * T)
+        decay = -S * pdf_d1 * sigma / (2 * sqrt_t)
+
+        delta = np.where(is_call, _norm_cdf(d1), _norm_cdf(d1) - 1.0)
+        gamma = pdf_d1 / (S * sigma * sqrt_t)
+        vega = S * pdf_d1 * sqrt_t / 100
+        theta = np.where(
+            is_call,
+            decay - r * discounted_strike * _norm_cdf(d2),
+            decay + r * discounted_strike * _norm_cdf(-d2)
+        ) / 365
+        rho = np.where(
+            is_call,
+            discounted_strike * T * _norm_cdf(d2),
+            -discounted_strike * T * _norm_cdf(-d2)
+        ) / 100
+
+    return {"delta": delta, "gamma": gamma, "theta": theta, "vega": vega, "rho": rho}
+
+def implied_volatility(price, S, K, T, r: float, is_call, tol: float = 1e-5, max_iter: int = 50) -> np.ndarray:
+    """
+    Solve for implied volatility of every option at once.
+    Runs vectorized Newton iterations inside a per-option bracket and falls back to
+    bisection wherever the Newton step leaves the bracket or vega is too small.
+    Options whose price is outside no-arbitrage bounds get NaN.
+    """
+    price, S, K, T, is_call = np.broadcast_arrays(
+        np.asarray(price, dtype=float), np.asarray(S, dtype=float),
+        np.asarray(K, dtype=float), np.asarray(T, dtype=float), np.asarray(is_call, dtype=bool)
+    )
+
+    with np.errstate(invalid='ignore'):
+        discounted_strike = K * np.exp(-r * T)
+        lower_bound = np.where(is_call, np.maximum(S - discounted_strike, 0.0), np.maximum(discounted_strike - S, 0.0))
+        upper_bound = np.where(is_call, S, discounted_strike)
+        solvable = (
+            np.isfinite(price) & np.isfinite(S) & np.isfinite(K) & np.isfinite(T)
+            & (S > 0) & (K > 0) & (T > 0)
+            & (price > lower_bound) & (price < upper_bound)
+        )
+
+    lo = np.full(price.shape, MIN_VOLATILITY)
+    hi = np.full(price.shape, MAX_VOLATILITY)
+
+    # Brenner-Subrahmanyam approximation as the starting point
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma = np.sqrt(2 * np.pi / T) * price / S
+    sigma = np.clip(np.nan_to_num(sigma, nan=0.3), 0.05, 2.0)
+
+    active = solvable.copy()
+    for _ in range(max_iter):
+        idx = np.flatnonzero(active)
+        if idx.size == 0:
+            break
+
+        s, k, t, call, target = S[idx], K[idx], T[idx], is_call[idx], price[idx]
+        vol = sigma[idx]
+        diff = black_scholes_price(s, k, t, r, vol, call) - target
+        converged = np.abs(diff) < tol
+
+        # Price is increasing in volatility, so the sign of diff tightens the bracket
+        too_high = diff > 0
+        lo_i = np.where(too_high, lo[idx], vol)
+        hi_i = np.where(too_high, vol, hi[idx])
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            d1, _ = _d1_d2(s, k, t, r, vol)
+            vega = s * _norm_pdf(d1) * np.sqrt(t)
+            newton = vol - diff / vega
+        use_newton = (vega > 1e-8) & (newton > lo_i) & (newton < hi_i)
+        next_vol = np.where(use_newton, newton, 0.5 * (lo_i + hi_i))
+
+        sigma[idx] = np.where(converged, vol, next_vol)
+        lo[idx] = lo_i
+        hi[idx] = hi_i
+        active[idx] = ~converged & ((hi_i - lo_i) > tol)
+
+    # Anything still pinned to the top of the range never bracketed the market price.
+    # The loop stops once the bracket is narrower than tol, so an unbracketed solve ends
+    # up to tol below MAX_VOLATILITY; the margin must be well above tol to catch it
+    return np.where(solvable & (sigma < MAX_VOLATILITY - 1e-3), sigma, np.nan)
+
+def _parse_expiry(expiry: str) -> datetime:
+    """Parse the vendor expiry date ("YYYY-MM-DD" with optional time part) as expiry time in IST"""
+    expiry_date = datetime.strptime(str(expiry)[:10], "%Y-%m-%d").date()
+    return IST.localize(datetime.combine(expiry_date, EXPIRY_TIME))
+
+def enrich_option_chain(records: List[OptionRecord], risk_free_rate: float = DEFAULT_RISK_FREE_RATE,
+                        valuation_time: Optional[datetime] = None) -> List[OptionRecord]:
+    """
+    Recompute IV and Greeks for option chain records in place.
+    All calls and puts (across any number of strikes and symbols) are priced in one batch.
+    Results go to each leg's model_iv/model_greeks, leaving the vendor values intact.
+    IV is in percent, matching the vendor field. Legs whose LTP cannot be inverted
+    (zero, stale or outside arbitrage bounds) get no model values.
+    """
+    if not records:
+        return records
+
+    now = valuation_time or datetime.now(IST)
+    if now.tzinfo is None:
+        now = IST.localize(now)
+
+    # All strikes in a chain share an expiry, so parse each distinct value once
+    expiry_years = {}
+    for record in records:
+        expiry = record.expiry
+        if expiry not in expiry_years:
+            try:
+                seconds = (_parse_expiry(expiry) - now).total_seconds()
+                expiry_years[expiry] = max(seconds / SECONDS_PER_YEAR, MIN_TIME_TO_EXPIRY)
+            except ValueError:
+                expiry_years[expiry] = np.nan  # Unknown expiry, no model values
+
+    strikes = np.array([record.strike_price for record in records], dtype=float)
+    spots = np.array([record.index_close for record in records], dtype=float)
+    years = np.array([expiry_years[record.expiry] for record in records], dtype=float)
+
+    legs = [record.calls for record in records] + [record.puts for record in records]
+    count = len(records)
+    S = np.concatenate((spots, spots))
+    K = np.concatenate((strikes, strikes))
+    T = np.concatenate((years, years))
+    is_call = np.concatenate((np.ones(count, dtype=bool), np.zeros(count, dtype=bool)))
+    ltp = np.array([leg.ltp for leg in legs], dtype=float)
+
+    iv = implied_volatility(ltp, S, K, T, risk_free_rate, is_call)
+    greeks = black_scholes_greeks(S, K, T, risk_free_rate, iv, is_call)
+
+    solved = np.isfinite(iv).tolist()
+    iv_percent = np.round(iv * 100, 2).tolist()
+    rounded = [(name, np.round(greeks[name], GREEK_DECIMALS).tolist()) for name, _ in GREEK_FIELDS]
+
+    for i, leg in enumerate(legs):
+        if not solved[i]:
+            leg.model_iv = None
+            leg.model_greeks = None
+            continue
+        leg.model_iv = iv_percent[i]
+        leg.model_greeks = {name: values[i] for name, values in rounded}
+
+    return records
@@ -0,0 +1,176 @@
+import cProfile
+import io
+import os
+import pstats
+import threading
+import tracemalloc
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+# Upper bound for one run; each profiled cycle keeps cProfile and tracemalloc running
+MAX_PROFILE_CYCLES = 100
+
+class CycleProfiler:
+    """
+    Profiles the next N monitoring cycles on demand with cProfile and tracemalloc.
+    Requested at runtime (HTTP endpoint or signal); while idle the per-cycle hooks
+    are a couple of attribute checks. Only the monitoring thread is profiled.
+    """
+    def __init__(self, output_dir: str = "profiles", top_count: int = 30, trace_frames: int = 10):
+        self.output_dir = output_dir
+        self.top_count = top_count
+        self.trace_frames = trace_frames
+
+        self.lock = threading.Lock()
+        self.requested_cycles = 0  # Set by request(), picked up at the start of the next cycle
+        self.signal_cycles = 0  # Set by request_from_signal(), turned into a request by start_cycle()
+        self.remaining_cycles = 0
+        self.cancel_requested = False  # Set by cancel(), ends the active run after the current cycle
+        self.active = False
+        self.in_cycle = False
+        self.profile: Optional[cProfile.Profile] = None
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.started_tracing = False
+        self.peak_traced = 0
+        self.last_report: Optional[str] = None
+
+    def request(self, cycles: int = 5) -> bool:
+        """
+        Ask for the next `cycles` cycles (at most MAX_PROFILE_CYCLES) to be profiled.
+        Returns False if a run is already in progress.
+        """
+        with self.lock:
+            if self.active or self.requested_cycles:
+                return False
+            self.requested_cycles = min(max(1, int(cycles)), MAX_PROFILE_CYCLES)
+        print(f"\nProfiling requested for the next {self.requested_cycles} cycles")
+        return True
+
+    def cancel(self) -> bool:
+        """
+        Drop a pending request, or stop the active run after the current cycle and write
+        the report for the cycles profiled so far. Returns False if nothing was requested.
+        """
+        with self.lock:
+            if self.requested_cycles:
+                self.requested_cycles = 0
+                print("\nProfiling request cancelled")
+                return True
+            if not self.active:
+                return False
+            self.cancel_requested = True
+        print("\nProfiling cancelled - stopping after the current cycle")
+        return True
+
+    def request_from_signal(self, cycles: int = 5) -> None:
+        """
+        Signal-safe variant of request(). Signal handlers run on the main thread, which
+        may already hold the lock inside start_cycle(), so this only stores the count.
+        """
+        self.signal_cycles = cycles
+
+    def status(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'active': self.active,
+                'requested_cycles': self.requested_cycles,
+                'remaining_cycles': self.remaining_cycles,
+                'cancel_requested': self.cancel_requested,
+                'last_report': self.last_report
+            }
+
+    def start_cycle(self) -> None:
+        if self.signal_cycles:
+            cycles, self.signal_cycles = self.signal_cycles, 0
+            self.request(cycles)
+
+        # Fast path while profiling is off
+        if not self.requested_cycles and not self.active:
+            return
+
+        starting = False
+        with self.lock:
+            if not self.active:
+                self.remaining_cycles = self.requested_cycles
+                self.requested_cycles = 0
+                self.active = True
+                starting = True
+
+        # Tracing is started outside the lock so status requests never wait on a snapshot
+        if starting:
+            self.profile = cProfile.Profile()
+            self.started_tracing = not tracemalloc.is_tracing()
+            if self.started_tracing:
+                tracemalloc.start(self.trace_frames)
+            self.baseline = tracemalloc.take_snapshot()
+
+        self.in_cycle = True
+        self.profile.enable()
+
+    def end_cycle(self) -> None:
+        if not self.in_cycle:
+            return
+
+        self.profile.disable()
+        self.in_cycle = False
+        self.remaining_cycles -= 1
+        if self.remaining_cycles <= 0 or self.cancel_requested:
+            self._finish()
+
+    def _finish(self) -> None:
+        snapshot = tracemalloc.take_snapshot()
+        _, self.peak_traced = tracemalloc.get_traced_memory()
+        if self.started_tracing:
+            tracemalloc.stop()
+
+        report_dir = os.path.join(self.output_dir, datetime.now().strftime('profile-%Y%m%d-%H%M%S'))
+        try:
+            self._write_report(report_dir, snapshot)
+            print(f"\nProfiling finished - report written to {report_dir}")
+        except OSError as e:
+            print(f"\nError writing profiling report: {e}")
+            report_dir = None
+
+        with self.lock:
+            self.active = False
+            self.cancel_requested = False
+            self.remaining_cycles = 0
+            self.profile = None
+            self.baseline = None
+            self.last_report = report_dir
+
+    def _write_report(self, report_dir: str, snapshot: tracemalloc.Snapshot) -> None:
+        os.makedirs(report_dir, exist_ok=True)
+
+        # Raw stats for snakeviz/pstats, plus a readable summary
+        self.profile.dump_stats(os.path.join(report_dir, "cycles.prof"))
+        for sort_key in ("cumulative", "tottime"):
+            stream = io.StringIO()
+            pstats.Stats(self.profile, stream=stream).sort_stats(sort_key).print_stats(self.top_count)
+            with open(os.path.join(report_dir, f"cpu_{sort_key}.txt"), "w", encoding="utf-8") as f:
+                f.write(stream.getvalue())
+
+        # Exclude the profilers' own bookkeeping from the allocation tables
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, cProfile.__file__),
+        ]
+        snapshot = snapshot.filter_traces(filters)
+        baseline = self.baseline.filter_traces(filters)
+
+        with open(os.path.join(report_dir, "allocations.txt"), "w", encoding="utf-8") as f:
+            f.write(f"Peak traced memory during the run: {self.peak_traced / 1024:.1f} KiB\n\n")
+            f.write(f"Top {self.top_count} allocation sites still alive at the end of the run\n\n")
+            for stat in snapshot.statistics("lineno")[:self.top_count]:
+                f.write(f"{stat}\n")
+
+            f.write(f"\nTop {self.top_count} allocation sites by growth during the run\n\n")
+            for stat in snapshot.compare_to(baseline, "lineno")[:self.top_count]:
+                f.write(f"{stat}\n")
+
+            f.write("\nLargest allocation tracebacks\n\n")
+            for stat in snapshot.statistics("traceback")[:5]:
+                f.write(f"{stat.count} blocks, {stat.size / 1024:.1f} KiB\n")
+                for line in stat.traceback.format():
+                    f.write(f"{line}\n")
+                f.write("\n")
@@ -1,3 +1,4 @@
+import os
 import requests
 from lxml.html import fromstring
 from pymongo import MongoClient
@@ -18,7 +19,7 @@ def get_proxies():
 def save_to_mongodb(proxies):
     try:
         # Connect to MongoDB
-        client = MongoClient('mongodb://localhost:27017/')
+        client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
         db = client['proxy_db']
         collection = db['proxies']
         
@@ -0,0 +1,152 @@
+"""
+Local harness for the proxy pool: runs a stub option chain API and stand-in HTTP
+proxies on localhost and checks rotation, eviction and direct fallback end to end.
+Needs no network access or MongoDB.
+
+    python proxy_harness.py
+"""
+
+import json
+import sys
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Tuple
+
+from api_client import NiftyAPIClient, SymbolConfig
+from proxy_pool import ProxyPool
+
+API_PATH = "/webapi/option/option-chain-data"
+
+STUB_RESPONSE = {
+    "result": 1,
+    "resultMessage": "Success",
+    "resultData": {"opDatas": [], "opTotals": {}}
+}
+
+class StubServer:
+    """Threaded HTTP server on a free localhost port, counting the requests it serves"""
+    def __init__(self, handle: Callable[[BaseHTTPRequestHandler], None]):
+        server = self
+        self.requests: List[str] = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append(self.path)
+                handle(self)
+
+            # Silence the log output
+            def log_message(self, format, *args):
+                return
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def address(self) -> str:
+        host, port = self.httpd.server_address
+        return f"{host}:{port}"
+
+    @property
+    def api_requests(self) -> int:
+        return sum(1 for path in self.requests if API_PATH in path)
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def _reply(handler: BaseHTTPRequestHandler, status: int, body: bytes, content_type: str) -> None:
+    handler.send_response(status)
+    handler.send_header("Content-Type", content_type)
+    handler.send_header("Content-Length", str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+def stub_api(handler: BaseHTTPRequestHandler) -> None:
+    if handler.path.startswith(API_PATH):
+        _reply(handler, 200, json.dumps(STUB_RESPONSE).encode(), "application/json")
+    else:
+        _reply(handler, 200, b"ok", "text/plain")
+
+def forwarding_proxy(handler: BaseHTTPRequestHandler) -> None:
+    """Plain HTTP proxy: the request line carries the absolute upstream URL"""
+    opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+    with opener.open(handler.path, timeout=5) as response:
+        _reply(handler, response.status, response.read(), response.headers.get("Content-Type", "text/plain"))
+
+def broken_proxy(handler: BaseHTTPRequestHandler) -> None:
+    """Passes the pool's health check but answers API requests with an HTML error page"""
+    if API_PATH in handler.path:
+        _reply(handler, 502, b"<html><body>Bad Gateway</body></html>", "text/html")
+    else:
+        forwarding_proxy(handler)
+
+def _client(api: StubServer, proxies: List[StubServer]) -> Tuple[NiftyAPIClient, ProxyPool]:
+    pool = ProxyPool(
+        proxies=[proxy.address for proxy in proxies],
+        load_from_db=False,
+        check_url=f"http://{api.address}/",
+        min_healthy=0,
+        refresh_interval_seconds=3600
+    )
+    pool.refresh()
+    client = NiftyAPIClient([SymbolConfig("nifty")], proxy_pool=pool, url=f"http://{api.address}{API_PATH}")
+    return client, pool
+
+def check_rotation_and_eviction(api: StubServer) -> List[str]:
+    good = [StubServer(forwarding_proxy), StubServer(forwarding_proxy)]
+    broken = StubServer(broken_proxy)
+    client, pool = _client(api, good + [broken])
+    failures = []
+    try:
+        results = [client.fetch_option_chain_for_symbol(client.symbols_config[0]) for _ in range(10)]
+        if any(result is None for result in results):
+            failures.append("a request failed although healthy proxies were available")
+        if broken.address in [proxy.split(" ")[0] for proxy in pool.snapshot()]:
+            failures.append("failing proxy was not evicted")
+        if not all(proxy.api_requests for proxy in good):
+            failures.append("requests were not rotated over all healthy proxies")
+    finally:
+        pool.close()
+        for proxy in good + [broken]:
+            proxy.stop()
+    return failures
+
+def check_direct_fallback(api: StubServer) -> List[str]:
+    broken = StubServer(broken_proxy)
+    client, pool = _client(api, [broken])
+    failures = []
+    try:
+        direct_before = api.api_requests
+        results = [client.fetch_option_chain_for_symbol(client.symbols_config[0]) for _ in range(2)]
+        if any(result is None for result in results):
+            failures.append("request was not retried over a direct connection")
+        if broken.api_requests != 2:
+            failures.append(f"failing proxy was retried within one request ({broken.api_requests} requests for 2 fetches)")
+        if api.api_requests - direct_before != 2:
+            failures.append("expected every fetch to fall back to a direct request")
+        if pool.healthy_count():
+            failures.append("failing proxy was not evicted after repeated failures")
+    finally:
+        pool.close()
+        broken.stop()
+    return failures
+
+def main():
+    api = StubServer(stub_api)
+    checks = [check_rotation_and_eviction, check_direct_fallback]
+    failed = False
+    try:
+        for check in checks:
+            failures = check(api)
+            print(f"{'FAIL' if failures else 'PASS'}: {check.__name__}")
+            for failure in failures:
+                print(f"  - {failure}")
+            failed = failed or bool(failures)
+    finally:
+        api.stop()
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set
+
+import requests
+from pymongo import MongoClient, DESCENDING
+from requests.adapters import HTTPAdapter
+
+from proxy_finder import get_proxies, save_to_mongodb
+
+# Any response below 500 from the upstream host means the proxy can reach it
+DEFAULT_CHECK_URL = "https://webapi.niftytrader.in/"
+
+class ProxyStats:
+    """A proxy with its own connection pool and running health statistics"""
+    __slots__ = ("address", "session", "latency", "error_rate", "consecutive_failures",
+                 "requests", "in_flight", "last_used")
+
+    def __init__(self, address: str, pool_size: int = 4):
+        self.address = address
+        self.latency = 0.0  # Exponentially weighted, seconds
+        self.error_rate = 0.0  # Exponentially weighted failure ratio, 0..1
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.in_flight = 0
+        self.last_used = 0.0
+
+        url = address if "://" in address else f"http://{address}"
+        self.session = requests.Session()
+        self.session.proxies = {"http": url, "https": url}
+        # Failed requests are retried on a different proxy, not through this one
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @property
+    def score(self) -> float:
+        """Lower is better: latency inflated by the recent error rate"""
+        return self.latency * (1 + 4 * self.error_rate)
+
+    def record(self, latency: float, success: bool, alpha: float = 0.3) -> None:
+        if self.requests == 0:
+            self.latency = latency
+        else:
+            self.latency = alpha * latency + (1 - alpha) * self.latency
+        self.error_rate = alpha * (0.0 if success else 1.0) + (1 - alpha) * self.error_rate
+        self.consecutive_failures = 0 if success else self.consecutive_failures + 1
+        self.requests += 1
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __str__(self):
+        return (f"{self.address} (latency {self.latency:.2f}s, errors {self.error_rate:.0%}, "
+                f"requests {self.requests})")
+
+class ProxyPool:
+    """
+    Health-scored rotating pool of proxies loaded from the proxy_db collection
+    populated by proxy_finder. Requests are spread over healthy proxies, failing
+    ones are evicted and the pool is refilled in the background when it runs low.
+    """
+    def __init__(self, proxies: Optional[Iterable[str]] = None, load_from_db: bool = True,
+                 scrape_on_refresh: bool = False, check_url: str = DEFAULT_CHECK_URL,
+                 check_timeout: float = 5, min_healthy: int = 3, max_consecutive_failures: int = 2,
+                 max_error_rate: float = 0.5, refresh_interval_seconds: float = 600,
+                 low_refresh_interval_seconds: float = 30, max_score_ratio: float = 3.0,
+                 pool_size: int = 4):
+        self.static_proxies: Set[str] = set(proxies or [])
+        self.load_from_db = load_from_db
+        self.scrape_on_refresh = scrape_on_refresh
+        self.check_url = check_url
+        self.check_timeout = check_timeout
+        self.min_healthy = min_healthy
+        self.max_consecutive_failures = max_consecutive_failures
+        self.max_error_rate = max_error_rate
+        self.refresh_interval_seconds = refresh_interval_seconds
+        # How often to retry refilling while below min_healthy
+        self.low_refresh_interval_seconds = low_refresh_interval_seconds
+        # Proxies scoring worse than this multiple of the best one are left idle
+        self.max_score_ratio = max_score_ratio
+        self.pool_size = pool_size
+
+        self.proxies: Dict[str, ProxyStats] = {}
+        self.lock = threading.Lock()
+        self.refreshing = False
+        self.last_refresh = 0.0
+
+    def _load_db_proxies(self) -> Set[str]:
+        """Latest proxy list saved by proxy_finder.save_to_mongodb"""
+        client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'),
+                             serverSelectionTimeoutMS=5000)
+        try:
+            document = client['proxy_db']['proxies'].find_one(sort=[("timestamp", DESCENDING)])
+            return set(document['proxies']) if document else set()
+        finally:
+            client.close()
+
+    def _candidates(self) -> Set[str]:
+        candidates = set(self.static_proxies)
+        if self.load_from_db:
+            try:
+                candidates.update(self._load_db_proxies())
+            except Exception as e:
+                print(f"Error loading proxies from MongoDB: {e}")
+        if self.scrape_on_refresh:
+            try:
+                scraped = get_proxies()
+                save_to_mongodb(scraped)
+                candidates.update(scraped)
+            except Exception as e:
+                print(f"Error scraping proxies: {e}")
+        return candidates
+
+    def _check(self, address: str) -> Optional[ProxyStats]:
+        proxy = ProxyStats(address, self.pool_size)
+        start = time.monotonic()
+        try:
+            response = proxy.session.get(self.check_url, timeout=self.check_timeout)
+            healthy = response.status_code < 500
+        except requests.exceptions.RequestException:
+            healthy = False
+        if not healthy:
+            proxy.close()
+            return None
+        proxy.record(time.monotonic() - start, True)
+        return proxy
+
+    def refresh(self) -> int:
+        """Health-check new candidate proxies concurrently and add the working ones. Returns healthy count"""
+        with self.lock:
+            known = set(self.proxies)
+        candidates = [address for address in self._candidates() if address not in known]
+
+        if candidates:
+            with ThreadPoolExecutor(max_workers=min(32, len(candidates))) as executor:
+                checked = [proxy for proxy in executor.map(self._check, candidates) if proxy]
+            with self.lock:
+                for proxy in checked:
+                    self.proxies[proxy.address] = proxy
+
+        with self.lock:
+            self.last_refresh = time.monotonic()
+            self.refreshing = False
+            healthy = len(self.proxies)
+        print(f"Proxy pool refreshed - {healthy} healthy proxies ({len(candidates)} candidates checked)")
+        return healthy
+
+    def _schedule_refresh(self) -> None:
+        """Refill in the background so a slow health check never stalls a fetch. Call with lock held"""
+        if self.refreshing:
+            return
+        self.refreshing = True
+        threading.Thread(target=self.refresh, daemon=True).start()
+
+    def acquire(self, exclude: Optional[Set[str]] = None) -> Optional[ProxyStats]:
+        """
+        Pick a proxy for the next request, rotating through every proxy whose score is
+        close to the best one so consecutive requests leave from different IPs.
+        Proxies in exclude (addresses already tried for this request) are skipped.
+        Returns None if no proxy is available.
+        """
+        with self.lock:
+            now = time.monotonic()
+            since_refresh = now - self.last_refresh
+            if (since_refresh >= self.refresh_interval_seconds
+                    or (len(self.proxies) < self.min_healthy and since_refresh >= self.low_refresh_interval_seconds)):
+                self._schedule_refresh()
+            candidates = [p for p in self.proxies.values() if not exclude or p.address not in exclude]
+            if not candidates:
+                return None
+
+            best_score = min(p.score for p in candidates)
+            eligible = [p for p in candidates if p.score <= best_score * self.max_score_ratio]
+            # Least busy, then least recently used; random tie-break for proxies never used yet
+            proxy = min(eligible, key=lambda p: (p.in_flight, p.last_used, random.random()))
+            proxy.in_flight += 1
+            proxy.last_used = now
+            return proxy
+
+    def release(self, proxy: ProxyStats, latency: float, success: bool) -> None:
+        """Record the outcome of a request and evict the proxy if it has become unhealthy"""
+        with self.lock:
+            proxy.in_flight -= 1
+            proxy.record(latency, success)
+            unhealthy = (proxy.consecutive_failures >= self.max_consecutive_failures
+                         or proxy.error_rate > self.max_error_rate)
+            pooled = self.proxies.get(proxy.address) is proxy
+            if unhealthy and pooled:
+                del self.proxies[proxy.address]
+                pooled = False
+                print(f"Evicted proxy {proxy}")
+            # Proxies no longer in the pool are closed once their last request finishes
+            if not pooled and proxy.in_flight == 0:
+                proxy.close()
+
+    def healthy_count(self) -> int:
+        with self.lock:
+            return len(self.proxies)
+
+    def snapshot(self) -> List[str]:
+        """Human readable state of every healthy proxy, best first"""
+        with self.lock:
+            return [str(proxy) for proxy in sorted(self.proxies.values(), key=lambda p: p.score)]
+
+    def close(self) -> None:
+        with self.lock:
+            for proxy in self.proxies.values():
+                proxy.close()
+            self.proxies.clear()
@@ -0,0 +1,138 @@
+from datetime import datetime
+from typing import Dict, Any, Tuple
+
+# Deduplication key of a strike snapshot: (symbol, expiry, strike_price, time)
+RecordKey = Tuple[str, str, float, str]
+
+# Greek attribute name -> display name used in stored documents
+GREEK_FIELDS = (
+    ("delta", "Delta"),
+    ("gamma", "Gamma"),
+    ("theta", "Theta"),
+    ("vega", "Vega"),
+    ("rho", "Rho"),
+)
+
+class OptionLeg:
+    """One side (calls or puts) of a strike. Slotted to avoid a per-leg __dict__ on the hot path"""
+    __slots__ = (
+        "oi", "change_oi", "volume", "iv", "ltp", "net_change", "bid_price", "ask_price",
+        "open", "high", "low", "oi_value", "change_oi_value", "average_price", "buildup",
+        "intrinsic", "time_value", "delta", "gamma", "theta", "vega", "rho",
+        "model_iv", "model_greeks"
+    )
+
+    @classmethod
+    def from_vendor(cls, data: Dict[str, Any], side: str, greek_side: str) -> "OptionLeg":
+        """Build a leg from a raw opDatas entry, e.g. side="calls", greek_side="call" """
+        leg = cls()
+        leg.oi = data[side + "_oi"]
+        leg.change_oi = data[side + "_change_oi"]
+        leg.volume = data[side + "_volume"]
+        leg.iv = data[side + "_iv"]
+        leg.ltp = data[side + "_ltp"]
+        leg.net_change = data[side + "_net_change"]
+        leg.bid_price = data[side + "_bid_price"]
+        leg.ask_price = data[side + "_ask_price"]
+        leg.open = data[side + "_open"]
+        leg.high = data[side + "_high"]
+        leg.low = data[side + "_low"]
+        leg.oi_value = data[side + "_oi_value"]
+        leg.change_oi_value = data[side + "_change_oi_value"]
+        leg.average_price = data[side + "_average_price"]
+        leg.buildup = data[side + "_builtup"]
+        leg.intrinsic = data[side + "_intrisic"]
+        leg.time_value = data[side + "_time_value"]
+        leg.delta = data[greek_side + "_delta"]
+        leg.gamma = data[greek_side + "_gamma"]
+        leg.theta = data[greek_side + "_theta"]
+        leg.vega = data[greek_side + "_vega"]
+        leg.rho = data[greek_side + "_rho"]
+        # Set by pricing.enrich_option_chain; vendor IV/Greeks are never overwritten
+        leg.model_iv = None
+        leg.model_greeks = None
+        return leg
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to the nested document layout stored in MongoDB"""
+        leg = {
+            "OI": self.oi,
+            "Change in OI": self.change_oi,
+            "Volume": self.volume,
+            "IV": self.iv,
+            "LTP": self.ltp,
+            "Net Change": self.net_change,
+            "Bid Price": self.bid_price,
+            "Ask Price": self.ask_price,
+            "Open": self.open,
+            "High": self.high,
+            "Low": self.low,
+            "OI Value": self.oi_value,
+            "Change OI Value": self.change_oi_value,
+            "Average Price": self.average_price,
+            "Buildup": self.buildup,
+            "Intrinsic": self.intrinsic,
+            "Time Value": self.time_value,
+            "Greeks": {
+                "Delta": self.delta,
+                "Gamma": self.gamma,
+                "Theta": self.theta,
+                "Vega": self.vega,
+                "Rho": self.rho
+            }
+        }
+        # Recomputed values sit next to the vendor ones, only on legs that were solved
+        if self.model_iv is not None:
+            leg["Model IV"] = self.model_iv
+            leg["Model Greeks"] = {display: self.model_greeks[name] for name, display in GREEK_FIELDS}
+        return leg
+
+class OptionRecord:
+    """A single strike of an option chain snapshot, kept as slotted objects until persistence"""
+    __slots__ = ("strike_price", "expiry", "pcr", "symbol", "index_close", "time", "calls", "puts")
+
+    @classmethod
+    def from_vendor(cls, data: Dict[str, Any]) -> "OptionRecord":
+        """Build a record from a raw opDatas entry"""
+        record = cls()
+        record.strike_price = data["strike_price"]
+        record.expiry = data["expiry_date"]
+        record.pcr = data["pcr"]
+        record.symbol = data["symbol_name"]
+        record.index_close = data["index_close"]
+        record.time = data["time"]
+        record.calls = OptionLeg.from_vendor(data, "calls", "call")
+        record.puts = OptionLeg.from_vendor(data, "puts", "put")
+        return record
+
+    @property
+    def key(self) -> RecordKey:
+        """Deduplication key for this record"""
+        return (self.symbol, self.expiry, self.strike_price, self.time)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to the display format produced by format_option_data"""
+        return {
+            "Strike Price": self.strike_price,
+            "Expiry": self.expiry,
+            "PCR": self.pcr,
+            "Symbol": self.symbol,
+            "Index Close": self.index_close,
+            "Time": self.time,
+            "Calls": self.calls.to_dict(),
+            "Puts": self.puts.to_dict()
+        }
+
+    def to_document(self, timestamp: datetime) -> Dict[str, Any]:
+        """Convert to a strike_prices document. Only called at the MongoDB boundary"""
+        return {
+            'timestamp': timestamp,
+            'strike_price': self.strike_price,
+            'expiry': self.expiry,
+            'pcr': self.pcr,
+            'symbol': self.symbol,
+            'index_close': self.index_close,
+            'time': self.time,
+            'calls': self.calls.to_dict(),
+            'puts': self.puts.to_dict()
+        }
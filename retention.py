@@ -0,0 +1,358 @@
+import argparse
+import glob
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+import pyarrow.parquet as pq
+from pymongo import ASCENDING, ReplaceOne
+
+from columnar import STRIKE_SCHEMA, flatten_strike_document, rows_to_table
+from db_handler import MongoDBHandler
+
+ARCHIVE_ROW_GROUP_SIZE = 50000
+
+class RetentionPolicy:
+    """How long each tier is kept"""
+    __slots__ = ("raw_days", "minute_bar_days", "archive_dir")
+
+    def __init__(self, raw_days: int = 7, minute_bar_days: int = 30, archive_dir: str = "archive"):
+        self.raw_days = raw_days  # Raw 2-second ticks stay in strike_prices this long
+        self.minute_bar_days = minute_bar_days  # 1-minute bars stay this long, 15-minute bars forever
+        self.archive_dir = archive_dir  # Raw ticks are exported here before deletion
+
+    def __str__(self):
+        return (f"raw {self.raw_days}d, 1m bars {self.minute_bar_days}d, "
+                f"15m bars forever, archive in {self.archive_dir}")
+
+def _start_of_day(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _archive_path(archive_dir: str, symbol: str, day: datetime) -> str:
+    return os.path.join(archive_dir, str(symbol).lower(), f"{day.strftime('%Y-%m-%d')}.parquet")
+
+def _leg_bar_fields(side: str) -> Dict[str, Any]:
+    field = f"${side}"
+    return {
+        f"{side}_open": {"$first": f"{field}.LTP"},
+        f"{side}_high": {"$max": f"{field}.LTP"},
+        f"{side}_low": {"$min": f"{field}.LTP"},
+        f"{side}_close": {"$last": f"{field}.LTP"},
+        f"{side}_oi": {"$last": f"{field}.OI"},
+        f"{side}_volume": {"$last": f"{field}.Volume"},
+        f"{side}_iv": {"$last": f"{field}.IV"},
+    }
+
+def _bucket(timestamp: datetime, minutes: int) -> datetime:
+    """Start of the bar containing timestamp, like $dateTrunc for sizes dividing an hour"""
+    return timestamp.replace(second=0, microsecond=0) - timedelta(minutes=timestamp.minute % minutes)
+
+def _first_last_range(values: List[Any]) -> Dict[str, Any]:
+    """Open/High/Low/Close with the null handling of $first, $max, $min and $last"""
+    present = [value for value in values if value is not None]
+    return {
+        "Open": values[0],
+        "High": max(present) if present else None,
+        "Low": min(present) if present else None,
+        "Close": values[-1],
+    }
+
+def bars_from_rows(symbol: str, rows: List[Dict[str, Any]], minutes: int) -> List[Dict[str, Any]]:
+    """
+    Build bar documents from flat archive rows, matching what downsample() produces
+    from raw ticks (same _id, fields and null handling). Rows must be in time order.
+    """
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for row in rows:
+        key = (row["expiry"], row["strike_price"], _bucket(row["timestamp"], minutes))
+        groups.setdefault(key, []).append(row)
+
+    bars = []
+    for (expiry, strike_price, bucket), ticks in groups.items():
+        bar = {
+            "_id": {"symbol": symbol, "expiry": expiry, "strike_price": strike_price, "bucket": bucket},
+            "symbol": symbol,
+            "expiry": expiry,
+            "strike_price": strike_price,
+            "bucket": bucket,
+            "index": _first_last_range([tick["index_close"] for tick in ticks]),
+            "pcr": ticks[-1]["pcr"],
+            "ticks": len(ticks),
+        }
+        for side in ("calls", "puts"):
+            leg = _first_last_range([tick[f"{side}_ltp"] for tick in ticks])
+            leg.update({
+                "OI": ticks[-1][f"{side}_oi"],
+                "Volume": ticks[-1][f"{side}_volume"],
+                "IV": ticks[-1][f"{side}_iv"],
+            })
+            bar[side] = leg
+        bars.append(bar)
+    return bars
+
+def _leg_bar_projection(side: str) -> Dict[str, Any]:
+    return {
+        "Open": f"${side}_open",
+        "High": f"${side}_high",
+        "Low": f"${side}_low",
+        "Close": f"${side}_close",
+        "OI": f"${side}_oi",
+        "Volume": f"${side}_volume",
+        "IV": f"${side}_iv",
+    }
+
+class RetentionManager:
+    """
+    Tiered retention for strike_prices: raw ticks for a few days, then 1-minute and
+    15-minute bars in their own collections. Raw days past retention are exported to
+    Parquet files before being deleted.
+    """
+    def __init__(self, db_handler: MongoDBHandler, policy: Optional[RetentionPolicy] = None):
+        self.db_handler = db_handler
+        self.policy = policy or RetentionPolicy()
+        self.strike_collection = db_handler.strike_collection
+        self.bar_collections = {
+            1: db_handler.db['strike_bars_1m'],
+            15: db_handler.db['strike_bars_15m'],
+        }
+
+        for collection in self.bar_collections.values():
+            collection.create_index([("bucket", ASCENDING)])
+            collection.create_index([("symbol", ASCENDING), ("strike_price", ASCENDING), ("bucket", ASCENDING)])
+
+    def downsample(self, start: datetime, end: datetime, minutes: int,
+                   exclude_symbols: Optional[List[str]] = None) -> None:
+        """
+        Roll raw ticks in [start, end) up into bars of the given size.
+        Bars replace existing ones with the same _id, so this is only correct while all
+        raw ticks of the range are still live; symbols whose day was already archived
+        are passed in exclude_symbols and rebuilt with rebuild_bars() instead.
+        """
+        match = {"timestamp": {"$gte": start, "$lt": end}}
+        if exclude_symbols:
+            match["symbol"] = {"$nin": exclude_symbols}
+        group = {
+            "_id": {
+                "symbol": "$symbol",
+                "expiry": "$expiry",
+                "strike_price": "$strike_price",
+                "bucket": {"$dateTrunc": {"date": "$timestamp", "unit": "minute", "binSize": minutes}},
+            },
+            "index_open": {"$first": "$index_close"},
+            "index_high": {"$max": "$index_close"},
+            "index_low": {"$min": "$index_close"},
+            "index_close": {"$last": "$index_close"},
+            "pcr": {"$last": "$pcr"},
+            "ticks": {"$sum": 1},
+            **_leg_bar_fields("calls"),
+            **_leg_bar_fields("puts"),
+        }
+        pipeline = [
+            {"$match": match},
+            {"$sort": {"timestamp": ASCENDING}},
+            {"$group": group},
+            {"$project": {
+                "symbol": "$_id.symbol",
+                "expiry": "$_id.expiry",
+                "strike_price": "$_id.strike_price",
+                "bucket": "$_id.bucket",
+                "index": {
+                    "Open": "$index_open",
+                    "High": "$index_high",
+                    "Low": "$index_low",
+                    "Close": "$index_close",
+                },
+                "pcr": 1,
+                "ticks": 1,
+                "calls": _leg_bar_projection("calls"),
+                "puts": _leg_bar_projection("puts"),
+            }},
+            {"$merge": {
+                "into": self.bar_collections[minutes].name,
+                "on": "_id",
+                "whenMatched": "replace",
+                "whenNotMatched": "insert",
+            }},
+        ]
+        self.strike_collection.aggregate(pipeline, allowDiskUse=True)
+
+    def archive_day(self, day: datetime) -> int:
+        """Export one day of raw ticks to per-symbol Parquet files. Returns rows written"""
+        start, end = day, day + timedelta(days=1)
+        day_query = {"timestamp": {"$gte": start, "$lt": end}}
+        written = 0
+
+        for symbol in self.strike_collection.distinct("symbol", day_query):
+            path = _archive_path(self.policy.archive_dir, symbol, day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = path + ".tmp"
+
+            cursor = self.strike_collection.find(
+                {**day_query, "symbol": symbol}, {"_id": 0}
+            ).sort("timestamp", ASCENDING)
+
+            # Stream into row groups so a full day never has to fit in memory
+            with pq.ParquetWriter(temp_path, STRIKE_SCHEMA, compression="zstd") as writer:
+                # A previous run may have archived this day and crashed before deleting
+                # everything; carry its rows over and skip ticks it already holds
+                archived_keys = set()
+                if os.path.exists(path):
+                    existing = pq.read_table(path, schema=STRIKE_SCHEMA)
+                    writer.write_table(existing)
+                    archived_keys = set(zip(existing.column("expiry").to_pylist(),
+                                            existing.column("strike_price").to_pylist(),
+                                            existing.column("time").to_pylist()))
+
+                rows = []
+                for document in cursor:
+                    row = flatten_strike_document(document)
+                    if (row["expiry"], row["strike_price"], row["time"]) in archived_keys:
+                        continue
+                    rows.append(row)
+                    if len(rows) >= ARCHIVE_ROW_GROUP_SIZE:
+                        writer.write_table(rows_to_table(rows))
+                        written += len(rows)
+                        rows = []
+                if rows:
+                    writer.write_table(rows_to_table(rows))
+                    written += len(rows)
+
+            # Only replace the archive once the file is complete
+            os.replace(temp_path, path)
+
+        return written
+
+    def rebuild_bars(self, symbol: str, day: datetime) -> None:
+        """
+        Rebuild a symbol's bars for one day from its archive file. Used once the archive
+        holds ticks that may no longer all be live (a rerun after a crash during deletion,
+        or ticks backfilled into a day that was already archived).
+        """
+        path = _archive_path(self.policy.archive_dir, symbol, day)
+        rows = sorted(pq.read_table(path, schema=STRIKE_SCHEMA).to_pylist(), key=lambda row: row["timestamp"])
+        for minutes, collection in self.bar_collections.items():
+            requests = [ReplaceOne({"_id": bar["_id"]}, bar, upsert=True)
+                        for bar in bars_from_rows(symbol, rows, minutes)]
+            if requests:
+                collection.bulk_write(requests, ordered=False)
+
+    def run(self, now: Optional[datetime] = None) -> None:
+        """Apply the retention policy to every full day older than the raw tier"""
+        now = now or datetime.now()
+        raw_cutoff = _start_of_day(now - timedelta(days=self.policy.raw_days))
+        minute_cutoff = _start_of_day(now - timedelta(days=self.policy.minute_bar_days))
+
+        oldest = self.strike_collection.find_one(
+            {"timestamp": {"$lt": raw_cutoff}}, {"timestamp": 1}, sort=[("timestamp", ASCENDING)]
+        )
+        day = _start_of_day(oldest["timestamp"]) if oldest else raw_cutoff
+
+        while day < raw_cutoff:
+            next_day = day + timedelta(days=1)
+
+            # Symbols archived by an earlier run may have lost live ticks to a partial delete,
+            # so their bars are rebuilt from the archive once this day's ticks are merged in
+            symbols = self.strike_collection.distinct("symbol", {"timestamp": {"$gte": day, "$lt": next_day}})
+            archived_before = [symbol for symbol in symbols
+                               if os.path.exists(_archive_path(self.policy.archive_dir, symbol, day))]
+
+            # Bars and archive first; raw ticks are only deleted once both exist
+            self.downsample(day, next_day, 1, archived_before)
+            self.downsample(day, next_day, 15, archived_before)
+            archived = self.archive_day(day)
+            for symbol in archived_before:
+                self.rebuild_bars(symbol, day)
+            deleted = self.strike_collection.delete_many({"timestamp": {"$gte": day, "$lt": next_day}}).deleted_count
+            print(f"Retention: {day.strftime('%Y-%m-%d')} - archived {archived} rows, deleted {deleted} raw ticks")
+
+            day = next_day
+
+        expired = self.bar_collections[1].delete_many({"bucket": {"$lt": minute_cutoff}}).deleted_count
+        if expired:
+            print(f"Retention: removed {expired} 1-minute bars older than {minute_cutoff.strftime('%Y-%m-%d')}")
+
+class TieredReader:
+    """Query strike data across live MongoDB ticks, Parquet archives and bar collections"""
+    def __init__(self, db_handler: MongoDBHandler, archive_dir: str = "archive"):
+        self.db_handler = db_handler
+        self.archive_dir = archive_dir
+
+    def _archived_rows(self, symbol: str, strike_price: float, start: datetime, end: datetime,
+                       expiry: Optional[str] = None) -> List[Dict[str, Any]]:
+        rows = []
+        pattern = os.path.join(self.archive_dir, str(symbol).lower(), "*.parquet")
+        for path in sorted(glob.glob(pattern)):
+            day = datetime.strptime(os.path.basename(path)[:10], "%Y-%m-%d")
+            if day + timedelta(days=1) <= start or day > end:
+                continue
+            filters = [
+                ("strike_price", "=", float(strike_price)),
+                ("timestamp", ">=", start),
+                ("timestamp", "<=", end),
+            ]
+            if expiry is not None:
+                filters.append(("expiry", "=", expiry))
+            table = pq.read_table(path, filters=filters)
+            rows.extend(table.to_pylist())
+        return rows
+
+    def query_strike_price(self, symbol: str, strike_price: float, start_time: datetime,
+                           end_time: Optional[datetime] = None, expiry: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Raw ticks for a symbol and strike between start_time and end_time, merged from
+        the archive and the live collection, optionally for a single expiry (as stored).
+        Rows use the flat archive layout and are returned in chronological order.
+        """
+        end_time = end_time or datetime.now()
+        rows = self._archived_rows(symbol, strike_price, start_time, end_time, expiry)
+
+        # A day can be both archived and still live (retention stopped before deleting it)
+        seen = {(row["expiry"], row["strike_price"], row["time"]) for row in rows}
+        query = {
+            "symbol": symbol,
+            "strike_price": strike_price,
+            "timestamp": {"$gte": start_time, "$lte": end_time},
+        }
+        if expiry is not None:
+            query["expiry"] = expiry
+        live = self.db_handler.strike_collection.find(query, {"_id": 0})
+        for document in live:
+            row = flatten_strike_document(document)
+            key = (row["expiry"], row["strike_price"], row["time"])
+            if key not in seen:
+                seen.add(key)
+                rows.append(row)
+
+        rows.sort(key=lambda row: row["timestamp"])
+        return rows
+
+    def query_bars(self, symbol: str, strike_price: float, start_time: datetime,
+                   end_time: Optional[datetime] = None, minutes: int = 1,
+                   expiry: Optional[str] = None) -> List[Dict[str, Any]]:
+        """1- or 15-minute bars for a symbol and strike in chronological order, optionally for one expiry"""
+        query = {"symbol": symbol, "strike_price": strike_price, "bucket": {"$gte": start_time}}
+        if end_time:
+            query["bucket"]["$lte"] = end_time
+        if expiry is not None:
+            query["expiry"] = expiry
+        collection = self.db_handler.db['strike_bars_1m' if minutes == 1 else 'strike_bars_15m']
+        return list(collection.find(query).sort("bucket", ASCENDING))
+
+def main():
+    parser = argparse.ArgumentParser(description="Downsample, archive and expire old strike data")
+    parser.add_argument("--raw-days", type=int, default=int(os.getenv('RETENTION_RAW_DAYS', '7')))
+    parser.add_argument("--minute-bar-days", type=int, default=int(os.getenv('RETENTION_MINUTE_BAR_DAYS', '30')))
+    parser.add_argument("--archive-dir", default=os.getenv('RETENTION_ARCHIVE_DIR', 'archive'))
+    args = parser.parse_args()
+
+    policy = RetentionPolicy(args.raw_days, args.minute_bar_days, args.archive_dir)
+    print(f"Applying retention policy: {policy}")
+
+    db_handler = MongoDBHandler()
+    try:
+        RetentionManager(db_handler, policy).run()
+    finally:
+        db_handler.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Runnable check for the retention job's resume paths. Uses a scratch database on the
+MongoDB at MONGODB_URI (dropped afterwards) and a temporary archive directory, and
+checks that bars, archives and tiered reads stay correct when a run is repeated after
+a crash during deletion or after ticks are backfilled into an archived day.
+Needs MongoDB 5.0+ for $dateTrunc.
+
+    MONGODB_URI=mongodb://localhost:27017/ python retention_harness.py
+"""
+
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+import pyarrow.parquet as pq
+
+from db_handler import MongoDBHandler
+from retention import RetentionManager, RetentionPolicy, TieredReader, _archive_path
+
+SCRATCH_DB = "nifty_options_retention_check"
+SYMBOL = "NIFTY"
+EXPIRY = "2025-04-24T00:00:00"
+STRIKES = (22000.0, 22100.0)
+
+def _leg(price: float, step: int) -> Dict[str, Any]:
+    return {"LTP": price, "OI": 1000.0 + step, "Volume": 10.0 * step, "IV": 12.5 + step / 100,
+            "Greeks": {"Delta": 0.5, "Gamma": 0.001, "Theta": -5.0, "Vega": 10.0, "Rho": 2.0}}
+
+def make_ticks(day: datetime, steps: range) -> List[Dict[str, Any]]:
+    """Strike documents every 2 minutes from 09:15, with prices that move within each bar"""
+    ticks = []
+    for step in steps:
+        timestamp = day.replace(hour=9, minute=15) + timedelta(minutes=2 * step)
+        for strike in STRIKES:
+            ticks.append({
+                "timestamp": timestamp,
+                "strike_price": strike,
+                "expiry": EXPIRY,
+                "pcr": 1.0 + step / 100,
+                "symbol": SYMBOL,
+                "index_close": 22050.0 + (step * 7) % 13,
+                "time": timestamp.strftime("%Y-%m-%dT%H:%M:%S"),
+                "calls": _leg(100.0 + (step * 5) % 11, step),
+                "puts": _leg(90.0 + (step * 3) % 7, step),
+            })
+    return ticks
+
+class Scratch:
+    """Fresh scratch database and archive directory for one check"""
+    def __init__(self):
+        self.archive_dir = tempfile.mkdtemp(prefix="retention-check-")
+        self.db_handler = MongoDBHandler(db_name=SCRATCH_DB)
+        self.db_handler.client.drop_database(SCRATCH_DB)
+        self.db_handler.ensure_indexes()
+        self.manager = RetentionManager(self.db_handler, RetentionPolicy(archive_dir=self.archive_dir))
+        self.reader = TieredReader(self.db_handler, archive_dir=self.archive_dir)
+
+    def insert(self, ticks: List[Dict[str, Any]]) -> None:
+        # Copies, since insert_many adds an _id to each document
+        self.db_handler.strike_collection.insert_many([dict(tick) for tick in ticks])
+
+    def bars(self) -> Dict[int, List[Dict[str, Any]]]:
+        return {minutes: list(collection.find().sort("_id", 1))
+                for minutes, collection in self.manager.bar_collections.items()}
+
+    def archived_rows(self, day: datetime) -> int:
+        return pq.read_metadata(_archive_path(self.archive_dir, SYMBOL, day)).num_rows
+
+    def live_ticks(self) -> int:
+        return self.db_handler.strike_collection.count_documents({})
+
+    def close(self) -> None:
+        self.db_handler.client.drop_database(SCRATCH_DB)
+        self.db_handler.close()
+        shutil.rmtree(self.archive_dir, ignore_errors=True)
+
+def reference_bars(day: datetime, ticks: List[Dict[str, Any]]) -> Dict[int, List[Dict[str, Any]]]:
+    """Bars from a single clean run over all ticks"""
+    scratch = Scratch()
+    try:
+        scratch.insert(ticks)
+        scratch.manager.run(now=day + timedelta(days=10))
+        return scratch.bars()
+    finally:
+        scratch.close()
+
+def check_clean_run(day: datetime, ticks: List[Dict[str, Any]]) -> List[str]:
+    failures = []
+    scratch = Scratch()
+    try:
+        scratch.insert(ticks)
+        scratch.manager.run(now=day + timedelta(days=10))
+        bars = scratch.bars()
+        if scratch.live_ticks():
+            failures.append("raw ticks were not deleted")
+        if scratch.archived_rows(day) != len(ticks):
+            failures.append(f"archive holds {scratch.archived_rows(day)} rows, expected {len(ticks)}")
+        if not bars[1] or not bars[15]:
+            failures.append("no bars were written")
+
+        # Bars rebuilt from the archive must match the aggregation pipeline's output
+        scratch.manager.rebuild_bars(SYMBOL, day)
+        if scratch.bars() != bars:
+            failures.append("bars rebuilt from the archive differ from downsampled bars")
+    finally:
+        scratch.close()
+    return failures
+
+def check_crash_during_delete(day: datetime, ticks: List[Dict[str, Any]],
+                              expected: Dict[int, List[Dict[str, Any]]]) -> List[str]:
+    failures = []
+    scratch = Scratch()
+    try:
+        scratch.insert(ticks)
+        next_day = day + timedelta(days=1)
+        manager = scratch.manager
+        manager.downsample(day, next_day, 1)
+        manager.downsample(day, next_day, 15)
+        manager.archive_day(day)
+        # Crash halfway through delete_many: only the first strike's ticks are gone
+        manager.strike_collection.delete_many({"strike_price": STRIKES[0]})
+
+        rows = scratch.reader.query_strike_price(SYMBOL, STRIKES[1], day, next_day)
+        if len(rows) != len(ticks) // len(STRIKES):
+            failures.append(f"tiered read returned {len(rows)} ticks for a day both archived and live, "
+                            f"expected {len(ticks) // len(STRIKES)}")
+
+        manager.run(now=day + timedelta(days=10))
+        if scratch.bars() != expected:
+            failures.append("rerun after a partial delete changed the bars")
+        if scratch.archived_rows(day) != len(ticks):
+            failures.append(f"archive holds {scratch.archived_rows(day)} rows after the rerun, expected {len(ticks)}")
+        if scratch.live_ticks():
+            failures.append("leftover raw ticks were not deleted by the rerun")
+    finally:
+        scratch.close()
+    return failures
+
+def check_backfill_into_archived_day(day: datetime, ticks: List[Dict[str, Any]], extra: List[Dict[str, Any]],
+                                     expected: Dict[int, List[Dict[str, Any]]]) -> List[str]:
+    failures = []
+    scratch = Scratch()
+    try:
+        scratch.insert(ticks)
+        scratch.manager.run(now=day + timedelta(days=10))
+
+        # A backfill re-imports part of the archived day plus ticks the archive never had
+        scratch.insert(ticks[len(ticks) // 2:] + extra)
+        scratch.manager.run(now=day + timedelta(days=10))
+
+        if scratch.bars() != expected:
+            failures.append("bars after backfilling an archived day differ from a clean run over all ticks")
+        if scratch.archived_rows(day) != len(ticks) + len(extra):
+            failures.append(f"archive holds {scratch.archived_rows(day)} rows, expected {len(ticks) + len(extra)}")
+    finally:
+        scratch.close()
+    return failures
+
+def main():
+    day = (datetime.now() - timedelta(days=30)).replace(hour=0, minute=0, second=0, microsecond=0)
+    ticks = make_ticks(day, range(0, 60))
+    extra = make_ticks(day, range(60, 75))
+
+    expected = reference_bars(day, ticks)
+    expected_with_extra = reference_bars(day, ticks + extra)
+    checks = [
+        ("check_clean_run", lambda: check_clean_run(day, ticks)),
+        ("check_crash_during_delete", lambda: check_crash_during_delete(day, ticks, expected)),
+        ("check_backfill_into_archived_day",
+         lambda: check_backfill_into_archived_day(day, ticks, extra, expected_with_extra)),
+    ]
+
+    failed = False
+    for name, check in checks:
+        failures = check()
+        print(f"{'FAIL' if failures else 'PASS'}: {name}")
+        for failure in failures:
+            print(f"  - {failure}")
+        failed = failed or bool(failures)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from records import OptionRecord, RecordKey
+
+class DataSink(ABC):
+    """
+    Destination for option chain snapshots. Sinks only receive records that have
+    already passed deduplication, so several sinks can run side by side.
+    """
+    @abstractmethod
+    def write(self, records: List[OptionRecord], totals_data: Dict[str, Any], timestamp: datetime,
+              analytics: Optional[Dict[str, Any]] = None) -> None:
+        """Persist one snapshot's new records"""
+
+    def tick(self) -> None:
+        """Time-based housekeeping, called every cycle and while waiting for the market to open"""
+
+    def flush(self) -> None:
+        """Persist anything buffered and finalize open files; the sink stays usable"""
+
+    def close(self) -> None:
+        pass
+
+def filter_new_records(records: List[OptionRecord],
+                       existing_records: Set[RecordKey]) -> Tuple[List[OptionRecord], int]:
+    """
+    Drop records whose key is already known and register the new ones.
+    Returns the new records and the number of duplicates skipped.
+    """
+    new_records = []
+    duplicate_records = 0
+
+    for record in records:
+        key = record.key
+        if key in existing_records:
+            duplicate_records += 1
+            continue
+        existing_records.add(key)
+        new_records.append(record)
+
+    return new_records, duplicate_records